@@ -0,0 +1,4 @@
+"""Benchmarks for Basements and Basilisks
+
+Run them from the repository root, e.g. `python -m benchmarks.import_time`.
+"""
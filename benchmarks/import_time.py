@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Measure how long it takes to import the inventory module in a fresh process
+
+Every worker process pays this, so it has a budget; the script exits with 1
+if the median import time goes over it.
+
+The budget is for the reference machine, a single-core Xeon VM running
+CPython 3.11, where the median is about 33 ms. Most of that is the standard
+library (typing, logging and uuid alone take about 20 ms). Single runs there
+vary by up to 25%, which is why the median is what's checked. On a
+different machine, measure the baseline commit first and pass --budget
+accordingly.
+
+Usage: python -m benchmarks.import_time [--runs N] [--budget MS]
+
+Created on 2026.10.18
+"""
+
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+
+MODULE = "scripts.inventory"
+# median cumulative import time of MODULE (including its own imports), in ms,
+# on the reference machine described above
+BUDGET_MS = 40.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_once(module: str=MODULE) -> float:
+    """Import module in a new interpreter and return the cumulative import time in ms."""
+    env = dict(os.environ)
+    # bytecode should be cached like it would be in a normal install
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    # lines look like "import time:  self [us] | cumulative | imported package"
+    pattern = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| " + re.escape(module) + "$")
+    for line in result.stderr.splitlines():
+        match = pattern.search(line)
+        if match:
+            return int(match.group(1)) / 1000
+
+    raise RuntimeError(f"{module} was not imported:\n{result.stderr}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="budget in ms")
+    args = parser.parse_args()
+
+    # warm-up run writes the bytecode cache
+    measure_once()
+    times = [measure_once() for _ in range(args.runs)]
+
+    median = statistics.median(times)
+    print(f"import {MODULE}: median {median:.2f} ms, min {min(times):.2f} ms, "
+          f"max {max(times):.2f} ms over {args.runs} runs (budget {args.budget:.2f} ms)")
+
+    if median > args.budget:
+        print("Over budget!")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
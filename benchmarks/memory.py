@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Measure how much memory ItemStacks and full SlotInventories take up
+
+Compares the __slots__ ItemStack with the same class backed by a __dict__
+(which is what ItemStack used to be).
+
+Usage: python -m benchmarks.memory [--stacks N]
+
+Created on 2026.10.18
+"""
+
+
+import argparse
+import gc
+import tracemalloc
+
+from scripts.inventory import Item, ItemStack, SlotInventory
+
+
+class DictItemStack(ItemStack):
+    """ItemStack with a per-instance __dict__, for comparison."""
+    pass
+
+
+def measure(function, *args) -> tuple[int, object]:
+    """Return how many bytes are still allocated after calling function, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated, result
+
+
+def make_stacks(stack_class: type, items: list[Item], count: int) -> list[ItemStack]:
+    return [stack_class(items[i % len(items)], 1) for i in range(count)]
+
+
+def fill_inventory(items: list[Item], slot_count: int) -> SlotInventory:
+    inventory = SlotInventory("Warehouse", slot_count)
+    # one stack per slot
+    for i in range(slot_count):
+        inventory.give(items[i % len(items)], items[i % len(items)].stack_size)
+    return inventory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stacks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    items = [Item(f"Item {i}", 64, 0.5) for i in range(100)]
+    # the list holding the stacks is the same for both, so it cancels out
+    list_size, _ = measure(lambda: [None] * args.stacks)
+
+    slotted, _ = measure(make_stacks, ItemStack, items, args.stacks)
+    with_dict, _ = measure(make_stacks, DictItemStack, items, args.stacks)
+    slotted -= list_size
+    with_dict -= list_size
+
+    print(f"{args.stacks} ItemStacks:")
+    print(f"  __slots__: {slotted / 2**20:8.2f} MiB ({slotted / args.stacks:.1f} B/stack)")
+    print(f"  __dict__:  {with_dict / 2**20:8.2f} MiB ({with_dict / args.stacks:.1f} B/stack)")
+    print(f"  saved {1 - slotted / with_dict:.0%}")
+
+    inventory_size, _ = measure(fill_inventory, items, args.stacks)
+    print(f"Full SlotInventory with {args.stacks} slots: {inventory_size / 2**20:.2f} MiB "
+          f"({inventory_size / args.stacks:.1f} B/slot)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the inventory engine
+
+Times each case, reports throughput and how many memory blocks each
+operation leaves allocated, and compares the throughput against the stored
+baseline (baseline.json next to this file). Exits with 1 if any case got
+slower than the baseline by more than the tolerance.
+
+Usage:
+    python -m benchmarks.run                   # run everything, compare to the baseline
+    python -m benchmarks.run --quick           # smaller sizes, for a quick check
+    python -m benchmarks.run -k slot           # only cases with "slot" in their name
+    python -m benchmarks.run --save-baseline   # store the results as the new baseline
+
+Baselines are only comparable on the same machine (and with the same
+--quick setting; quick results are stored separately), so baseline.json
+isn't checked in. The first run on a machine stores its results as the
+baseline, and so does the first run of a case that was added since.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from typing import Callable, NamedTuple
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class Case(NamedTuple):
+    name: str
+    # builds whatever the case needs and returns the operation to time
+    setup: Callable[[], Callable[[], object]]
+    # how many times to call the operation per timing run
+    number: int
+    # timing runs; None uses the --repeat setting
+    repeat: int | None = None
+
+
+class Result(NamedTuple):
+    name: str
+    ops_per_second: float
+    # memory blocks still allocated after an operation, on average
+    blocks_per_op: float
+
+
+def make_items(count: int, stack_size: int=16) -> list[Item]:
+    return [Item(f"Bench item {i}", stack_size, 0.25) for i in range(count)]
+
+
+# Cases ------------------------------------------------------------------------
+
+def slot_cases(slot_counts: tuple[int, ...]) -> list[Case]:
+    apple = Item("Bench apple", 16, 0.125)
+    filler = make_items(8)
+    cases = []
+
+    for slot_count in slot_counts:
+        def empty(slot_count=slot_count):
+            inventory = SlotInventory("Bench", slot_count)
+            def operation():
+                inventory.give(apple, 20)
+                inventory.take(apple, 20)
+            return operation
+
+        def fragmented(slot_count=slot_count):
+            # apples in every other slot (other things in between), and the
+            # only partial stack of them is in the last one
+            inventory = SlotInventory("Bench", slot_count)
+            last_apple = (slot_count - 1) // 2 * 2
+            stacks = []
+            for i in range(slot_count):
+                if i == last_apple:
+                    stacks.append((i, apple, 8))
+                elif i % 2 == 0:
+                    stacks.append((i, apple, 16))
+                else:
+                    stacks.append((i, filler[i % len(filler)], 16))
+            inventory._load(stacks)
+            def operation():
+                inventory.give(apple, 5)
+                inventory.take(apple, 5)
+            return operation
+
+        def full(slot_count=slot_count):
+            # nowhere to put the apple, and none to take
+            inventory = SlotInventory("Bench", slot_count)
+            inventory._load((i, filler[i % len(filler)], 16) for i in range(slot_count))
+            def operation():
+                inventory.give(apple, 1)
+                inventory.take(apple, 1)
+            return operation
+
+        # the big ones are slow enough as it is
+        number = 20_000 if slot_count <= 1000 else 2_000
+        cases.append(Case(f"slot_give_take[{slot_count}-empty]", empty, number))
+        cases.append(Case(f"slot_give_take[{slot_count}-fragmented]", fragmented, number))
+        cases.append(Case(f"slot_give_take[{slot_count}-full]", full, number))
+
+        def contains(slot_count=slot_count):
+            inventory = SlotInventory("Bench", slot_count)
+            inventory._load((i, filler[i % len(filler)], 16) for i in range(slot_count))
+            return lambda: inventory.contains(apple, 1) or inventory.has_space_for(apple, 1)
+
+        cases.append(Case(f"slot_contains_has_space[{slot_count}-full]", contains, 50_000))
+
+    return cases
+
+
+def counter_cases() -> list[Case]:
+    items = make_items(100)
+
+    def give_take():
+        inventory = Inventory("Bench")
+        for item in items:
+            inventory.give(item, 10)
+        item = items[50]
+        def operation():
+            inventory.give(item, 3)
+            inventory.take(item, 3)
+        return operation
+
+    def contains():
+        inventory = Inventory("Bench")
+        for item in items:
+            inventory.give(item, 10)
+        item = items[50]
+        return lambda: inventory.contains(item, 5)
+
+    return [Case("counter_give_take", give_take, 50_000),
+            Case("counter_contains", contains, 100_000)]
+
+
+def transfer_cases() -> list[Case]:
+    items = make_items(20)
+
+    def transfer():
+        slotted = SlotInventory("Bench box", 100)
+        slotless = Inventory("Bench chest")
+        slotted.give(items[0], 50)
+        def operation():
+            slotted.transfer(slotless, items[0], 7)
+            slotless.transfer(slotted, items[0], 7)
+        return operation
+
+    def transfer_all():
+        slotted = SlotInventory("Bench box", 100)
+        slotless = Inventory("Bench chest")
+        for item in items:
+            slotted.give(item, 30)
+        def operation():
+            slotted.transfer_all(slotless)
+            slotless.transfer_all(slotted)
+        return operation
+
+    return [Case("transfer[slot<->counter]", transfer, 20_000),
+            Case("transfer_all[slot<->counter, 20 items]", transfer_all, 1_000)]
+
+
+def nested_cases(depth: int=10, slot_count: int=1000) -> list[Case]:
+    items = make_items(4)
+
+    def build():
+        handler = InventoryHandler._init()
+        inventories = []
+        inner = None
+        for level in range(depth):
+            inventory = SlotInventory(f"Bag {level}", slot_count)
+            for item in items:
+                inventory.give(item, 40)
+            if inner is not None:
+                inventory.give(inner)
+            inner = handler.add_container(f"Bag {level}", 0.5, inventory)
+            inventories.append(inventory)
+        # innermost first
+        return handler, inventories
+
+    def mass():
+        _handler, inventories = build()
+        outermost = inventories[-1]
+        return lambda: outermost.mass
+
+    def change_innermost():
+        # every change has to reach the outermost bag
+        _handler, inventories = build()
+        innermost = inventories[0]
+        def operation():
+            innermost.give(items[0], 1)
+            innermost.take(items[0], 1)
+        return operation
+
+    def is_empty():
+        _handler, inventories = build()
+        # the last slot of each bag is the only one that's empty
+        for inventory in inventories:
+            inventory.take(items[0], 40)
+        def operation():
+            for inventory in inventories:
+                inventory.is_empty
+        return operation
+
+    return [Case(f"nested_mass[depth {depth}]", mass, 100_000),
+            Case(f"nested_change[depth {depth}]", change_innermost, 20_000),
+            Case(f"nested_is_empty[depth {depth}, {slot_count} slots]", is_empty, 2_000)]
+
+
+def handler_cases(inventory_count: int) -> list[Case]:
+    apple = Item("Bench apple", 16, 0.125)
+
+    def add():
+        handler = InventoryHandler._init()
+        return lambda: handler.add(Inventory("Bench"))
+
+    def build():
+        handler = InventoryHandler._init()
+        ids = []
+        for i in range(inventory_count):
+            inventory = Inventory("Bench")
+            if i % 1000 == 0:
+                inventory.give(apple, 3)
+            ids.append(handler.add(inventory))
+        return handler, ids
+
+    def get():
+        handler, ids = build()
+        reference_id = ids[len(ids) // 2]
+        return lambda: handler.get(reference_id)
+
+    def locate():
+        handler, _ids = build()
+        return lambda: handler.total(apple)
+
+    # registering inventory_count inventories once is the benchmark
+    return [Case(f"handler_add[{inventory_count}]", add, inventory_count, repeat=1),
+            Case(f"handler_get[{inventory_count} registered]", get, 100_000),
+            Case(f"handler_total[{inventory_count} registered]", locate, 10_000)]
+
+
+def all_cases(quick: bool) -> list[Case]:
+    if quick:
+        return (slot_cases((10, 1000, 10_000)) + counter_cases() + transfer_cases()
+                + nested_cases() + handler_cases(100_000))
+    return (slot_cases((10, 1000, 100_000)) + counter_cases() + transfer_cases()
+            + nested_cases() + handler_cases(1_000_000))
+
+
+# Running ----------------------------------------------------------------------
+
+def run_case(case: Case, repeat: int) -> Result:
+    operation = case.setup()
+    # warm up (and make sure it actually works)
+    operation()
+
+    best = float("inf")
+    blocks = 0
+    for _ in range(case.repeat or repeat):
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        for _ in range(case.number):
+            operation()
+        elapsed = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks_before
+        best = min(best, elapsed)
+
+    return Result(case.name, case.number / best, blocks / case.number)
+
+
+def load_baseline(key: str) -> dict[str, float]:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as file:
+        return json.load(file).get(key, {})
+
+
+def save_baseline(key: str, results: list[Result]) -> None:
+    data = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as file:
+            data = json.load(file)
+
+    data.setdefault(key, {}).update({result.name: round(result.ops_per_second, 1) for result in results})
+    with open(BASELINE_PATH, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+    parser.add_argument("-k", dest="keyword", default="", help="only run cases containing this")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per case (best one counts)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much slower than the baseline a case may be (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    key = "quick" if args.quick else "full"
+    baseline = load_baseline(key)
+    results = []
+    regressions = []
+
+    print(f"{'case':<48} {'ops/s':>12} {'blocks/op':>10} {'vs baseline':>12}")
+    for case in all_cases(args.quick):
+        if args.keyword not in case.name:
+            continue
+
+        result = run_case(case, args.repeat)
+        results.append(result)
+
+        if result.name in baseline:
+            ratio = result.ops_per_second / baseline[result.name]
+            comparison = f"{ratio:11.2f}x"
+            if ratio < 1 - args.tolerance:
+                regressions.append(result.name)
+                comparison += " !"
+        else:
+            comparison = f"{'new':>12}"
+
+        print(f"{result.name:<48} {result.ops_per_second:12,.0f} {result.blocks_per_op:10.2f} {comparison}")
+        # big cases hold on to a lot of memory
+        del case
+        gc.collect()
+
+    if args.save_baseline:
+        save_baseline(key, results)
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+
+    new_results = [result for result in results if result.name not in baseline]
+    if new_results:
+        save_baseline(key, new_results)
+        print(f"Added {len(new_results)} new case(s) to the baseline in {BASELINE_PATH}")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
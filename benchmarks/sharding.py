@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Measure how NPC trading scales with the number of ShardedWorld workers
+
+Runs the same random trades in one process (InventoryHandler.transfer())
+and in a ShardedWorld with 1 to N workers, and checks that no Items were
+lost or duplicated along the way. Trades go to the world in batches, so
+the cost of talking to the workers is spread over many of them.
+
+Usage: python -m benchmarks.sharding [--workers N] [--inventories N] [--trades N] [--batch N]
+
+Created on 2026.10.18
+"""
+
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item
+from scripts.sharding import ShardedWorld
+from scripts import snapshot
+
+
+def build_world(inventory_count: int, seed: int=0) -> tuple[InventoryHandler, list[Item]]:
+    rng = random.Random(seed)
+    items = [Item(f"Trade good {i}", rng.choice((1, 16, 64)), rng.random()) for i in range(50)]
+    handler = InventoryHandler._init()
+
+    for i in range(inventory_count):
+        if i % 4 == 0:
+            inventory = Inventory(f"Merchant {i}")
+        else:
+            inventory = SlotInventory(f"NPC {i}", 40)
+        for _ in range(20):
+            inventory.give(rng.choice(items), rng.randint(1, 16))
+        handler.add(inventory)
+
+    return handler, items
+
+
+def make_trades(handler: InventoryHandler, items: list[Item], count: int, seed: int=1) -> list[tuple]:
+    rng = random.Random(seed)
+    ids = handler.list_ids()
+    return [(*rng.sample(ids, 2), rng.choice(items), rng.randint(1, 10)) for _ in range(count)]
+
+
+def totals(handler: InventoryHandler) -> Counter:
+    result = Counter()
+    for inventory in handler.inventories.values():
+        result.update(inventory.counts())
+    return +result
+
+
+def single_process(handler: InventoryHandler, trades: list[tuple]) -> float:
+    start = time.perf_counter()
+    for source_id, target_id, item, count in trades:
+        handler.transfer(source_id, target_id, item, count)
+    return time.perf_counter() - start
+
+
+def sharded(handler: InventoryHandler, trades: list[tuple], workers: int, batch: int) -> tuple[float, InventoryHandler]:
+    """Return how long the trades took (not counting starting the workers) and the end result."""
+    with ShardedWorld(handler, workers) as world:
+        start = time.perf_counter()
+        for i in range(0, len(trades), batch):
+            world.trade(trades[i:i + batch])
+        elapsed = time.perf_counter() - start
+        return elapsed, world.collect()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="up to this many")
+    parser.add_argument("--inventories", type=int, default=2000)
+    parser.add_argument("--trades", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=20_000, help="trades per ShardedWorld.trade() call")
+    args = parser.parse_args()
+
+    handler, items = build_world(args.inventories)
+    trades = make_trades(handler, items, args.trades)
+    expected = totals(handler)
+    data = snapshot.dumps(handler)
+
+    baseline = single_process(snapshot.loads(data), trades)
+    print(f"{args.trades} trades between {args.inventories} inventories, in batches of {args.batch}")
+    print(f"{'workers':>8} {'seconds':>10} {'trades/s':>12} {'speedup':>8}")
+    print(f"{'(none)':>8} {baseline:10.3f} {args.trades / baseline:12,.0f} {1:8.2f}x")
+
+    failed = False
+    for workers in range(1, args.workers + 1):
+        elapsed, result = sharded(snapshot.loads(data), trades, workers, args.batch)
+        problem = ""
+        if totals(result) != expected:
+            problem = "  Items were lost or duplicated!"
+            failed = True
+        print(f"{workers:>8} {elapsed:10.3f} {args.trades / elapsed:12,.0f} {baseline / elapsed:8.2f}x{problem}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Measure how long it takes to save and load a snapshot of a large world
+
+Usage: python -m benchmarks.snapshot [--inventories N] [--slots N] [--runs N]
+
+Created on 2026.10.18
+"""
+
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item
+from scripts import snapshot
+
+
+def build_world(inventory_count: int, slot_count: int, seed: int=0) -> InventoryHandler:
+    """Build a handler full of half-filled inventories, some of them in bags."""
+    rng = random.Random(seed)
+    items = [Item(f"Item {i}", rng.choice((1, 16, 64)), rng.random()) for i in range(500)]
+    handler = InventoryHandler._init()
+
+    for i in range(inventory_count):
+        if i % 4 == 0:
+            inventory = Inventory(f"Chest {i}")
+        else:
+            inventory = SlotInventory(f"Box {i}", slot_count)
+        for _ in range(slot_count // 2):
+            inventory.give(rng.choice(items), rng.randint(1, 16))
+
+        if i % 10 == 1:
+            # put every tenth inventory in a bag inside the previous one
+            bag = handler.add_container(f"Bag {i}", 0.5, inventory)
+            handler.get(handler.list_ids()[-2]).give(bag)
+        else:
+            handler.add(inventory)
+
+    return handler
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inventories", type=int, default=10_000)
+    parser.add_argument("--slots", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    handler = build_world(args.inventories, args.slots)
+    entries = sum(len(inventory.counts()) for inventory in handler.inventories.values())
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "world.bnbs")
+        save_times = []
+        load_times = []
+        for _ in range(args.runs):
+            save_times.append(timed(snapshot.save, handler, path)[0])
+            load_times.append(timed(snapshot.load, path)[0])
+        size = os.path.getsize(path)
+
+    print(f"{args.inventories} inventories, {entries} (inventory, item) pairs, {size / 2**20:.2f} MiB:")
+    print(f"  save: median {statistics.median(save_times) * 1000:.1f} ms")
+    print(f"  load: median {statistics.median(load_times) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
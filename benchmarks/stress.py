@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Hammer a concurrent InventoryHandler with transfers from many threads
+
+Every thread keeps moving random Items between random inventories (single
+transfers, batch transfers and transactions), and bags between inventories
+(including into each other). Items are only ever moved, so afterwards every
+Item has to add up to what there was at the start, every bag has to be in
+exactly one place without any bag ending up inside itself, and the
+handler's lookup tables and cached masses and nested counts have to match
+the inventories. Exits with 1 if anything got duplicated or lost.
+
+Usage: python -m benchmarks.stress [--threads N] [--inventories N] [--operations N]
+
+Created on 2026.10.18
+"""
+
+
+import argparse
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from scripts.inventory import (InventoryHandler, Inventory, SlotInventory, Item, ContainerItem,
+                               ContainerError, TransactionError, _check_nested_counts)
+
+
+def build_world(inventory_count: int, seed: int=0) -> tuple[InventoryHandler, list[Item], list[ContainerItem]]:
+    rng = random.Random(seed)
+    items = [Item(f"Stress item {i}", rng.choice((1, 8, 16)), rng.random()) for i in range(20)]
+    handler = InventoryHandler._init(concurrent=True)
+
+    ids = []
+    for i in range(inventory_count):
+        if i % 3 == 0:
+            inventory = Inventory(f"Chest {i}")
+        else:
+            inventory = SlotInventory(f"Box {i}", 30)
+        for _ in range(10):
+            inventory.give(rng.choice(items), rng.randint(1, 20))
+        ids.append(handler.add(inventory))
+
+    # a few bags, so masses have to be passed on to parents as well
+    bags = []
+    for i in range(0, inventory_count // 10):
+        bag = handler.add_container(f"Bag {i}", 0.5, SlotInventory(f"Bag {i}", 10))
+        # chests always have room
+        handler.give(ids[3 * i], bag)
+        ids.append(bag.inventory_id)
+        bags.append(bag)
+
+    return handler, items, bags
+
+
+def worker(handler: InventoryHandler, items: list[Item], bags: list[ContainerItem], operations: int,
+           seed: int) -> None:
+    rng = random.Random(seed)
+    ids = handler.list_ids()
+
+    for _ in range(operations):
+        source_id, target_id = rng.sample(ids, 2)
+        item = rng.choice(items)
+        choice = rng.random()
+
+        if choice < 0.05:
+            # move a bag from wherever it is (it may be gone by the time the
+            # locks are taken, then nothing happens); other threads move
+            # bags too, so they race to put bags inside each other
+            bag = rng.choice(bags)
+            parent = bag.inventory.parent
+            if parent is None:
+                continue
+            try:
+                handler.transfer(parent._id, rng.choice(ids), bag)
+            except ContainerError:
+                pass
+        elif choice < 0.6:
+            handler.transfer(source_id, target_id, item, rng.randint(1, 30))
+        elif choice < 0.8:
+            handler.transfer_many(source_id, target_id, {rng.choice(items): rng.randint(1, 10) for _ in range(3)})
+        else:
+            other_id = rng.choice(ids)
+            try:
+                with handler.transaction() as transaction:
+                    transaction.transfer(source_id, target_id, item, rng.randint(1, 10))
+                    transaction.transfer(target_id, other_id, item, rng.randint(1, 10))
+            except TransactionError:
+                pass
+
+
+def totals(handler: InventoryHandler) -> Counter:
+    result = Counter()
+    for inventory in handler.inventories.values():
+        result.update(inventory.counts())
+    return result
+
+
+def check(handler: InventoryHandler, expected: Counter, bags: list[ContainerItem]) -> list[str]:
+    """Return a description of everything that doesn't add up."""
+    problems = []
+
+    for bag in bags:
+        locations = handler.locate(bag)
+        parent = bag.inventory.parent
+        if len(locations) != 1 or parent is None or handler.get(next(iter(locations))) is not parent:
+            problems.append(f"{bag.name} is in {len(locations)} places")
+        # a bag inside itself would never get to the top
+        depth = 0
+        while parent is not None and depth <= len(bags):
+            parent = parent.parent
+            depth += 1
+        if parent is not None:
+            problems.append(f"{bag.name} ended up inside itself")
+            # the nested counts can't be checked; they'd go round forever
+            return problems
+
+    actual = totals(handler)
+    for item in expected.keys() | actual.keys():
+        if actual[item] != expected[item]:
+            problems.append(f"{item}: {actual[item]} instead of {expected[item]}")
+
+    for item in actual:
+        locations = {reference_id: inventory.amount(item) for reference_id, inventory in handler.inventories.items()
+                     if inventory.amount(item) > 0}
+        if handler.locate(item) != locations:
+            problems.append(f"locate({item}) doesn't match the inventories")
+
+    for inventory in handler.inventories.values():
+        if not math.isclose(inventory.mass, inventory._recompute_mass(), rel_tol=1e-9, abs_tol=1e-6):
+            problems.append(f"Cached mass of '{inventory.name}' is off")
+        try:
+            _check_nested_counts(inventory)
+        except AssertionError:
+            problems.append(f"Nested counts of '{inventory.name}' are off")
+
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--inventories", type=int, default=50)
+    parser.add_argument("--operations", type=int, default=5000, help="per thread")
+    args = parser.parse_args()
+
+    # switch threads as often as possible, so races actually happen
+    sys.setswitchinterval(1e-6)
+
+    handler, items, bags = build_world(args.inventories)
+    expected = totals(handler)
+
+    threads = [threading.Thread(target=worker, args=(handler, items, bags, args.operations, seed))
+               for seed in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    operations = args.threads * args.operations
+    print(f"{operations} operations on {len(handler.inventories)} inventories from {args.threads} threads "
+          f"in {elapsed:.2f} s ({operations / elapsed:,.0f} ops/s)")
+
+    problems = check(handler, expected, bags)
+    if problems:
+        print(f"{len(problems)} problem(s):")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        return 1
+
+    print("Every Item is accounted for")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
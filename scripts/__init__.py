@@ -0,0 +1,5 @@
+"""Basements and Basilisks
+
+Importing the package (or any module in it) has no side effects; see
+scripts.inventory.setup_logging() for configuring logging.
+"""
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Columnar mirror of every inventory in an InventoryHandler, for bulk queries
+
+Needs NumPy, which is optional for the rest of the game. Create the handler
+with InventoryHandler._init(columnar=True) and the store is kept up to date
+by the inventories themselves; it's never written to directly.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from typing import Callable, Collection, TYPE_CHECKING
+from uuid import UUID
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from .inventory import ContainerItem
+except ImportError:
+    from inventory import ContainerItem
+
+if TYPE_CHECKING:
+    from .inventory import Item
+
+
+class ColumnarStore(object):
+    """Every (inventory, item, count) held by an InventoryHandler as NumPy columns.
+
+    Item masses and stack sizes are kept in tables indexed by the same item
+    index as the item column. The mass of a container changes with its
+    contents, so the masses of ContainerItems are refreshed from their
+    inventories before every mass query.
+    """
+    # row index -> UUID / Item
+    inventory_ids: list[UUID]
+    items: list[Item]
+    # columns; only the first `size` rows are in use
+    inventory_column: np.ndarray
+    item_column: np.ndarray
+    count_column: np.ndarray
+    size: int
+    # indexed by item index
+    item_mass: np.ndarray
+    item_stack_size: np.ndarray
+
+
+    def __init__(self, capacity: int=1024) -> ColumnarStore:
+        if np is None:
+            raise ImportError("ColumnarStore needs NumPy (pip install numpy)")
+
+        self.inventory_ids = []
+        self._inventory_index: dict[UUID, int] = {}
+        self.items = []
+        self._item_index: dict[Item, int] = {}
+        # item indices of ContainerItems
+        self._containers: list[int] = []
+        # (inventory index, item index) -> row
+        self._rows: dict[tuple[int, int], int] = {}
+
+        self.inventory_column = np.zeros(capacity, dtype=np.int32)
+        self.item_column = np.zeros(capacity, dtype=np.int32)
+        self.count_column = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+        self.item_mass = np.zeros(64, dtype=np.float64)
+        self.item_stack_size = np.zeros(64, dtype=np.int64)
+
+
+    def __repr__(self) -> str:
+        return f"ColumnarStore(inventories={len(self.inventory_ids)}, items={len(self.items)}, rows={self.size})"
+
+
+    def _inventory(self, reference_id: UUID) -> int:
+        index = self._inventory_index.get(reference_id)
+        if index is None:
+            index = self._inventory_index[reference_id] = len(self.inventory_ids)
+            self.inventory_ids.append(reference_id)
+        return index
+
+
+    def _item(self, item: Item) -> int:
+        index = self._item_index.get(item)
+        if index is None:
+            index = self._item_index[item] = len(self.items)
+            self.items.append(item)
+
+            if index >= len(self.item_mass):
+                self.item_mass = np.resize(self.item_mass, 2 * len(self.item_mass))
+                self.item_stack_size = np.resize(self.item_stack_size, 2 * len(self.item_stack_size))
+            self.item_mass[index] = item.base_mass
+            self.item_stack_size[index] = item.stack_size
+            if isinstance(item, ContainerItem):
+                self._containers.append(index)
+        return index
+
+
+    def change(self, reference_id: UUID, item: Item, delta: int) -> None:
+        """Add delta to the count of an Item in an inventory."""
+        key = (self._inventory(reference_id), self._item(item))
+        row = self._rows.get(key)
+
+        if row is None:
+            if self.size == len(self.count_column):
+                # grow all the columns together
+                capacity = 2 * len(self.count_column)
+                self.inventory_column = np.resize(self.inventory_column, capacity)
+                self.item_column = np.resize(self.item_column, capacity)
+                self.count_column = np.resize(self.count_column, capacity)
+
+            row = self._rows[key] = self.size
+            self.inventory_column[row], self.item_column[row] = key
+            self.count_column[row] = 0
+            self.size += 1
+
+        # rows that drop to 0 are kept; the pair will probably come back
+        self.count_column[row] += delta
+
+
+    def _columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (self.inventory_column[:self.size], self.item_column[:self.size],
+                self.count_column[:self.size])
+
+
+    def total(self, item: Item) -> int:
+        """Return how many of an Item there are across all inventories."""
+        index = self._item_index.get(item)
+        if index is None:
+            return 0
+
+        _inventories, items, counts = self._columns()
+        return int(counts[items == index].sum())
+
+
+    def totals(self) -> dict[Item, int]:
+        """Return how many of each Item there are across all inventories."""
+        _inventories, items, counts = self._columns()
+        result = np.bincount(items, weights=counts, minlength=len(self.items))
+
+        return {item: int(result[i]) for i, item in enumerate(self.items) if result[i] > 0}
+
+
+    def holders(self, item: Item) -> dict[UUID, int]:
+        """Return the inventories holding an Item, and how many of it they hold."""
+        index = self._item_index.get(item)
+        if index is None:
+            return {}
+
+        inventories, items, counts = self._columns()
+        mask = (items == index) & (counts > 0)
+
+        return {self.inventory_ids[i]: int(c) for i, c in zip(inventories[mask], counts[mask])}
+
+
+    def _refresh_container_masses(self) -> None:
+        for index in self._containers:
+            container = self.items[index]
+            # the inventory of a container that's gone isn't in any row anymore
+            if container.inventory_id in container.inventory_handler.inventories:
+                self.item_mass[index] = container.mass
+
+
+    def masses(self) -> np.ndarray:
+        """Return the mass of every inventory (including the contents of the
+        containers in it), indexed like inventory_ids."""
+        self._refresh_container_masses()
+        inventories, items, counts = self._columns()
+
+        return np.bincount(inventories, weights=counts * self.item_mass[items],
+                           minlength=len(self.inventory_ids))
+
+
+    def heavier_than(self, mass: float) -> list[UUID]:
+        """Return the inventories whose contents weigh more than mass."""
+        return [self.inventory_ids[i] for i in np.flatnonzero(self.masses() > mass)]
+
+
+    def plan_update(self, items: Collection[Item], update: Callable) -> list[tuple[UUID, Item, int]]:
+        """Work out how the counts of items change when update is applied to them.
+
+        update gets an array of counts and returns an array of new counts.
+        Returns the (inventory, item, delta) of every row that changed; it's up
+        to the caller to apply them (see InventoryHandler.bulk_update()).
+        """
+        indices = [self._item_index[item] for item in items if item in self._item_index]
+        inventories, item_column, counts = self._columns()
+        rows = np.flatnonzero(np.isin(item_column, indices) & (counts > 0))
+
+        new_counts = np.asarray(update(counts[rows]), dtype=np.int64)
+        deltas = np.maximum(new_counts, 0) - counts[rows]
+        changed = np.flatnonzero(deltas)
+
+        return [(self.inventory_ids[inventories[rows[i]]], self.items[item_column[rows[i]]], int(deltas[i]))
+                for i in changed]
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Change events for inventories, so UIs and game systems don't have to poll
+
+An InventoryHandler created with events=True has an EventBus that its
+inventories report every change to. Changes are collected until the game
+calls InventoryHandler.flush_events() (once per tick), then coalesced and
+handed to the subscribers:
+
+    def on_pickup(events: list[Event]) -> None:
+        ...
+
+    handler.events.subscribe(on_pickup, kinds={ITEM_ADDED}, items={golden_apple})
+    ...
+    handler.flush_events()
+
+Coalescing means every subscriber gets one call per tick at most, and an
+Item that was added and taken again within a tick doesn't show up at all.
+What's reported:
+    ITEM_ADDED/ITEM_REMOVED  net change in the amount of an Item in an
+                             inventory (count is always positive)
+    SLOT_CHANGED             a slot of a SlotInventory that was touched, with
+                             what's in it now (item is None if it's empty)
+    INVENTORY_ADDED/...      an inventory was registered with / removed from
+    INVENTORY_REMOVED        the handler
+
+Only registered inventories report changes, since events identify them by
+UUID.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from typing import Callable, Collection, NamedTuple, TYPE_CHECKING
+from uuid import UUID
+
+if TYPE_CHECKING:
+    from .inventory import SlotInventory, Item
+
+
+# event kinds
+ITEM_ADDED = "item_added"
+ITEM_REMOVED = "item_removed"
+SLOT_CHANGED = "slot_changed"
+INVENTORY_ADDED = "inventory_added"
+INVENTORY_REMOVED = "inventory_removed"
+KINDS = (ITEM_ADDED, ITEM_REMOVED, SLOT_CHANGED, INVENTORY_ADDED, INVENTORY_REMOVED)
+
+
+class Event(NamedTuple):
+    kind: str
+    inventory_id: UUID
+    item: Item | None = None
+    # ITEM_ADDED/ITEM_REMOVED: how many; SLOT_CHANGED: how many are in the slot now
+    count: int = 0
+    # SLOT_CHANGED only
+    slot: int | None = None
+
+
+class Subscription(NamedTuple):
+    """A callback and the events it wants; None means no filter."""
+    callback: Callable[[list[Event]], object]
+    kinds: frozenset[str] | None
+    items: frozenset[Item] | None
+    inventories: frozenset[UUID] | None
+
+
+    def matches(self, event: Event) -> bool:
+        return ((self.kinds is None or event.kind in self.kinds)
+                and (self.items is None or event.item in self.items)
+                and (self.inventories is None or event.inventory_id in self.inventories))
+
+
+class EventBus(object):
+    """Collects changes from a handler's inventories and delivers them as events.
+
+    Subscriptions are indexed by inventory (or else by Item), so delivering
+    a tick's events only looks at the subscriptions that could want them.
+    """
+    subscriptions: list[Subscription]
+
+
+    def __init__(self) -> EventBus:
+        self.subscriptions = []
+        # subscriptions by the inventories / Items they filter on; the rest
+        # (no filter on either) get every event offered
+        self._by_inventory: dict[UUID, list[Subscription]] = {}
+        self._by_item: dict[Item, list[Subscription]] = {}
+        self._unfiltered: list[Subscription] = []
+
+        # what happened since the last flush
+        # (inventory UUID, Item) -> net change
+        self._changes: dict[tuple[UUID, Item], int] = {}
+        # SlotInventories that were compacted or sorted
+        self._arranged: set[UUID] = set()
+        self._added: list[UUID] = []
+        self._removed: list[UUID] = []
+
+
+    def __repr__(self) -> str:
+        return f"EventBus({len(self.subscriptions)} subscriptions, {len(self._changes)} pending changes)"
+
+
+    def subscribe(self, callback: Callable[[list[Event]], object], kinds: Collection[str] | None=None,
+                  items: Collection[Item] | None=None,
+                  inventories: Collection[UUID] | None=None) -> Subscription:
+        """Call callback with the matching events of every tick.
+
+        kinds, items and inventories filter the events (an event has to pass
+        all of them); INVENTORY_* events (and SLOT_CHANGED for emptied
+        slots) have no Item, so they never pass an items filter. Returns the Subscription, for unsubscribe().
+        """
+        if kinds is not None:
+            unknown = set(kinds).difference(KINDS)
+            if len(unknown) > 0:
+                raise ValueError(f"Unknown event kinds: {', '.join(sorted(unknown))}")
+
+        subscription = Subscription(callback,
+                                    None if kinds is None else frozenset(kinds),
+                                    None if items is None else frozenset(items),
+                                    None if inventories is None else frozenset(inventories))
+        self.subscriptions.append(subscription)
+        for subscribers in self._subscribers(subscription):
+            subscribers.append(subscription)
+        return subscription
+
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.remove(subscription)
+        for subscribers in self._subscribers(subscription):
+            subscribers.remove(subscription)
+        # drop the lists that are now empty
+        for index in (self._by_inventory, self._by_item):
+            for key in [key for key in (subscription.inventories or frozenset()) | (subscription.items or frozenset())
+                        if key in index and len(index[key]) == 0]:
+                del index[key]
+
+
+    def _subscribers(self, subscription: Subscription) -> list[list[Subscription]]:
+        """Return the lists in the index a subscription goes in.
+
+        Every subscription is indexed under one filter only, so it's offered
+        each event just once.
+        """
+        if subscription.inventories is not None:
+            return [self._by_inventory.setdefault(inventory_id, []) for inventory_id in subscription.inventories]
+        if subscription.items is not None:
+            return [self._by_item.setdefault(item, []) for item in subscription.items]
+        return [self._unfiltered]
+
+
+    def change(self, inventory_id: UUID, item: Item, delta: int) -> None:
+        """Record that the amount of an Item in an inventory changed by delta."""
+        key = (inventory_id, item)
+        self._changes[key] = self._changes.get(key, 0) + delta
+
+
+    def arrange(self, inventory_id: UUID) -> None:
+        """Record that a SlotInventory's stacks were laid out again."""
+        self._arranged.add(inventory_id)
+
+
+    def added(self, inventory_id: UUID) -> None:
+        self._added.append(inventory_id)
+
+
+    def removed(self, inventory_id: UUID) -> None:
+        self._removed.append(inventory_id)
+
+
+    def collect(self) -> tuple[list[Event], set[UUID]]:
+        """Turn everything recorded since the last call into events and start over.
+
+        Also returns the UUIDs of the inventories whose contents changed, for
+        slot_events(). In concurrent mode, call this under the handler's lock
+        (see InventoryHandler.flush_events()).
+        """
+        events = [Event(INVENTORY_ADDED, inventory_id) for inventory_id in self._added]
+
+        touched = self._arranged
+        for (inventory_id, item), delta in self._changes.items():
+            touched.add(inventory_id)
+            if delta > 0:
+                events.append(Event(ITEM_ADDED, inventory_id, item, delta))
+            elif delta < 0:
+                events.append(Event(ITEM_REMOVED, inventory_id, item, -delta))
+
+        events.extend(Event(INVENTORY_REMOVED, inventory_id) for inventory_id in self._removed)
+
+        self._changes = {}
+        self._arranged = set()
+        self._added = []
+        self._removed = []
+        return events, touched
+
+
+    def deliver(self, events: list[Event]) -> int:
+        """Hand events to the matching subscribers, one call each; returns how many were called."""
+        if len(self.subscriptions) == 0:
+            return 0
+
+        # subscription -> its events, in the order they were first matched
+        matched: dict[int, tuple[Subscription, list[Event]]] = {}
+        for event in events:
+            candidates = self._unfiltered + self._by_inventory.get(event.inventory_id, [])
+            if event.item is not None:
+                candidates += self._by_item.get(event.item, [])
+            for subscription in candidates:
+                if subscription.matches(event):
+                    # Subscriptions are compared by value, so key them by identity
+                    entry = matched.get(id(subscription))
+                    if entry is None:
+                        entry = matched[id(subscription)] = (subscription, [])
+                    entry[1].append(event)
+
+        for subscription, subscription_events in matched.values():
+            subscription.callback(subscription_events)
+        return len(matched)
+
+
+def slot_events(inventory_id: UUID, inventory: SlotInventory) -> list[Event]:
+    """Return SLOT_CHANGED events for the slots touched since the last call.
+
+    In concurrent mode, call this holding the inventory's lock.
+    """
+    dirty_slots = inventory._dirty_slots
+    if not dirty_slots:
+        return []
+
+    events = []
+    slots = inventory.slots
+    for index in sorted(dirty_slots):
+        slot = slots[index]
+        if slot is None:
+            events.append(Event(SLOT_CHANGED, inventory_id, None, 0, index))
+        else:
+            events.append(Event(SLOT_CHANGED, inventory_id, slot.item, slot.count, index))
+    dirty_slots.clear()
+    return events
@@ -1,47 +1,153 @@
 """Custom function for getting user input
 
+get_input() reads from the console, or from any other input source: a
+callable that works like input() (see lines() and recording()).
+get_input_async() reads from an asyncio stream (a socket, stdin via
+stdin_reader(), or an in-memory StreamReader in tests). Both cast and check
+the input the same way.
+
 Created on 2025.01.15
 @author: Widmo
 """
 
 
+from __future__ import annotations
+from typing import Callable, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # asyncio takes a while to import; only the async functions need it, and
+    # they get their streams passed in
+    import asyncio
+
+
+# returned by _parse() for input that should be asked for again
+_REJECTED = object()
+
+
+def _parse(raw_in: str, desired_type: type, bounds: tuple[float | int | None]) -> ...:
+    """Cast raw input to desired_type and check that it's within bounds.
+
+    Returns _REJECTED if it can't be cast or is out of bounds.
+    """
+    try:
+        typed_in = desired_type(raw_in)
+    except ValueError:
+        return _REJECTED
+
+    # check bounds
+    if bounds != (None, None):
+        if desired_type == int or desired_type == float:
+            value = typed_in
+        else:
+            try:
+                value = len(typed_in)
+            except:
+                raise TypeError(f"Cannot check bounds of an instance of {desired_type}")
+                value = None
+
+        # Lower bound
+        if bounds[0] is not None:
+            if value < bounds[0]:
+                # discard out-of-bounds value
+                return _REJECTED
+
+        # Upper bound
+        if bounds[1] is not None:
+            if value > bounds[1]:
+                # discard out-of-bounds value
+                return _REJECTED
+
+    return typed_in
+
+
 def get_input(desired_type: type=str, check_bounds=False,
               bounds: tuple[float | int | None]=(None, None),
-              prompt: str="> ") -> ...:
+              prompt: str="> ", read: Callable[[str], str] | None=None,
+              max_attempts: int | None=None) -> ...:
     """Get input from the user, cast it to the correct type and check that it's
     within bounds.
 
-    No bounds by default.
+    No bounds by default. Reads with input() unless another read function is
+    given (which raises EOFError when it runs out, like input() does). Keeps
+    asking until the input is valid, or raises ValueError after max_attempts
+    invalid ones.
     """
+    if read is None:
+        read = input
+
+    attempts = 0
     while True:
-        raw_in = input(prompt)
+        raw_in = read(prompt)
+
+        typed_in = _parse(raw_in, desired_type, bounds)
+        if typed_in is not _REJECTED:
+            return typed_in
+
+        attempts += 1
+        if max_attempts is not None and attempts >= max_attempts:
+            raise ValueError(f"No valid input after {attempts} attempts (last one was {raw_in!r})")
+
 
+def lines(source: Iterable[str]) -> Callable[[str], str]:
+    """Return a read function for get_input() that takes lines from source.
+
+    source can be anything that yields lines, like a list or an open file.
+    Raises EOFError once it's used up. The prompt is ignored.
+    """
+    iterator = iter(source)
+
+    def read(prompt: str="") -> str:
         try:
-            typed_in = desired_type(raw_in)
-        except ValueError:
-            continue
-
-        # check bounds
-        if bounds != (None, None):
-            if desired_type == int or desired_type == float:
-                value = typed_in
-            else:
-                try:
-                    value = len(typed_in)
-                except:
-                    raise TypeError(f"Cannot check bounds of an instance of {desired_type}")
-                    value = None
-
-            # Lower bound
-            if bounds[0] is not None:
-                if value < bounds[0]:
-                    # discard out-of-bounds value
-                    continue
-
-            # Upper bound
-            if bounds[1] is not None:
-                if value > bounds[1]:
-                    # discard out-of-bounds value
-                    continue
-
-        return typed_in
+            line = next(iterator)
+        except StopIteration:
+            raise EOFError("No more input") from None
+        return line.rstrip("\r\n")
+
+    return read
+
+
+def recording(read: Callable[[str], str] | None, log: list[str]) -> Callable[[str], str]:
+    """Wrap a read function (input() if None) so every line read is also appended to log."""
+    if read is None:
+        read = input
+
+    def recording_read(prompt: str="") -> str:
+        line = read(prompt)
+        log.append(line)
+        return line
+
+    return recording_read
+
+
+async def get_input_async(reader: asyncio.StreamReader, desired_type: type=str, check_bounds=False,
+                          bounds: tuple[float | int | None]=(None, None),
+                          prompt: str="> ", writer: asyncio.StreamWriter | None=None) -> ...:
+    """Like get_input(), but reads lines from an asyncio stream.
+
+    The prompt is written to writer, if there is one. Raises EOFError when
+    the stream ends, just like input() does.
+    """
+    while True:
+        if writer is not None and prompt:
+            writer.write(prompt.encode("utf-8"))
+            await writer.drain()
+
+        line = await reader.readline()
+        if not line:
+            raise EOFError("Input stream ended")
+        raw_in = line.decode("utf-8").rstrip("\r\n")
+
+        typed_in = _parse(raw_in, desired_type, bounds)
+        if typed_in is not _REJECTED:
+            return typed_in
+
+
+async def stdin_reader() -> asyncio.StreamReader:
+    """Return a StreamReader reading from stdin (for get_input_async())."""
+    import asyncio
+    import sys
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return reader
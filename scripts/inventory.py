@@ -7,60 +7,428 @@ Created on2025.06.04
 
 
 from __future__ import annotations
-from typing import NamedTuple, Callable, Counter, Collection
+from typing import NamedTuple, Callable, Counter, Collection, Iterable, Iterator, Mapping, TYPE_CHECKING
+from collections.abc import Awaitable
 # from types import MappingProxyType
 from uuid import UUID, uuid4
+from bisect import insort
+from contextlib import contextmanager, nullcontext
+from heapq import heappush, heappop, nsmallest
 import logging
-from get_input import get_input
+import math
+import os
+import threading
+
+try:
+    from .get_input import get_input, get_input_async
+    from . import render
+except ImportError:
+    # running as a script from inside scripts/
+    from get_input import get_input, get_input_async
+    import render
+
+if TYPE_CHECKING:
+    import asyncio
+    from .columnar import ColumnarStore
+    from .events import EventBus
+    from .journal import Journal
+
+
+# Importing this module doesn't touch the filesystem or configure logging;
+# call setup_logging() for that (the __main__ block below does).
+# Can be overridden with environment variables. BNB_LOG_LEVEL=OFF disables
+# the game's logging, BNB_LOG_FILE="" keeps the level but doesn't write a file.
+LOG_LEVEL = os.environ.get("BNB_LOG_LEVEL", "DEBUG").upper()
+LOG_FILE = os.environ.get("BNB_LOG_FILE", os.path.join(os.path.dirname(__file__), "..", "logs", "latest.log"))
 
-
-# Needed because the logger doesn't clear the log file, despite being explicitly set to "wt"
-with open('../logs/latest.log', "w"):
-    pass
-logging.basicConfig(filename='../logs/latest.log', filemode="wt", encoding='utf-8', level=logging.DEBUG)
 log = logging.getLogger(__name__)
 # log.setLevel(logging.DEBUG)
 
+# the QueueHandler and QueueListener installed by the last setup_logging() call
+_log_queue: tuple[logging.Handler, logging.handlers.QueueListener] | None = None
+
+
+def _game_logger() -> logging.Logger:
+    """Return the logger all the game's modules log under: "scripts", or the
+    root logger when running from inside scripts/ (there's no package then)."""
+    return logging.getLogger(__package__ or None)
+
+
+def setup_logging(level: int | str=LOG_LEVEL, filename: str | None=LOG_FILE) -> logging.handlers.QueueListener | None:
+    """Configure logging for the game.
+
+    Records are put on a queue and written to filename (truncated first) by a
+    background thread, so logging doesn't block the game loop. Pass
+    level="OFF" to disable logging entirely, or a falsy filename to skip the
+    log file. Returns the QueueListener doing the writing, if there is one.
+
+    Only the game's own loggers are touched, so other loggers in the same
+    process keep their configuration. Calling it again replaces the previous
+    configuration (instead of writing every record twice).
+    """
+    global _log_queue
+    _stop_logging()
+
+    if isinstance(level, str):
+        level = level.upper()
+    game_log = _game_logger()
+    if level == "OFF":
+        # above every level, so every isEnabledFor() call in the game is False
+        game_log.setLevel(logging.CRITICAL + 1)
+        return None
+
+    game_log.setLevel(level)
+    if not filename:
+        return None
+
+    # imported here because logging.handlers pulls in socket, pickle etc.,
+    # which would slow down importing this module
+    from logging.handlers import QueueHandler, QueueListener
+    from queue import SimpleQueue
+    import atexit
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    file_handler = logging.FileHandler(filename, mode="w", encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    queue = SimpleQueue()
+    queue_handler = QueueHandler(queue)
+    game_log.addHandler(queue_handler)
+
+    listener = QueueListener(queue, file_handler)
+    listener.start()
+    # make sure everything gets written before exiting
+    atexit.register(listener.stop)
+
+    _log_queue = (queue_handler, listener)
+    return listener
+
+
+def _stop_logging() -> None:
+    """Remove the handler installed by setup_logging() and write out what's left in its queue."""
+    global _log_queue
+    if _log_queue is None:
+        return
+    import atexit
+
+    queue_handler, listener = _log_queue
+    _log_queue = None
+    _game_logger().removeHandler(queue_handler)
+    listener.stop()
+    atexit.unregister(listener.stop)
+    for handler in listener.handlers:
+        handler.close()
+
+# Set to True to check cached values (like inventory mass) against a full
+# recompute every time they're read. Slow, only meant for debugging.
+DEBUG_CACHES = False
+
 
 def main():
     ...
 
 
 def print_list(lst: Collection, offset: int=0, _filter: Callable=None, processor: Callable=None,
-               header: str=None, template: str="  {}: {}", empty: str="  ~Empty~") -> None:
-    if _filter is None:
-        _filter = lambda x: True
-
-    if processor is None:
-        processor = lambda x: str(x)
+               header: str=None, template: str="  {}: {}", empty: str="  ~Empty~",
+               start: int=0, stop: int | None=None, output: Callable[[str], None]=print) -> None:
+    """Print lst[start:stop] as a numbered list, preceded by an empty line."""
+    with render.Buffer(output) as buffer:
+        buffer.line()
+        if header is not None:
+            buffer.line(header)
+
+        if len(lst) > 0:
+            buffer.lines(render.list_rows(lst, offset, _filter, processor, template, start, stop))
+        else:
+            buffer.line(empty)
 
-    if header is None:
-        result = ""
-    else:
-        result = "\n" + header
 
-    if len(lst) > 0:
-        for i, item in enumerate(lst):
-            if not _filter(item):
-                continue
 
-            result += "\n" + template.format(i + offset, processor(item))
-    else:
-        result += "\n" + empty
 
-    print(result)
 
 
 
+class InventoryNotFoundError(KeyError):
+    """Raised when referencing a non-existant or deleted inventory."""
+    pass
 
 
+class ContainerError(ValueError):
+    """Raised when a container would end up inside itself, or in two places at once."""
+    pass
 
 
-class InventoryNotFoundError(KeyError):
-    """Raised when referencing a non-existant or deleted inventory."""
+class TransactionError(Exception):
+    """Raised when a Transaction can't be carried out in full (nothing is changed)."""
     pass
 
 
+class TransferResult(NamedTuple):
+    """How many of an Item were asked for and actually moved in a batch transfer."""
+    item: Item
+    requested: int
+    moved: int
+
+
+class FitPlan(NamedTuple):
+    """What giving several Items to an inventory would do; see SlotInventory.fit_plan()."""
+    # Item -> how many were asked for / would fit
+    requested: dict[Item, int]
+    accepted: dict[Item, int]
+    # Item -> [(slot index, how many would go in there)], in the order
+    # give() would fill them; None for a slotless Inventory
+    slots: dict[Item, list[tuple[int, int]]] | None
+
+    @property
+    def fits(self) -> bool:
+        """Check if everything would fit."""
+        return self.accepted == self.requested
+
+
+class Transaction(object):
+    """Stages give/take operations on any number of inventories and applies
+    them all at once (or not at all).
+
+    Use through InventoryHandler.transaction():
+
+        with handler.transaction() as tx:
+            tx.take(player_id, gold, 10)
+            tx.give(merchant_id, gold, 10)
+
+    Nothing changes until the with block ends. The operations are then tried
+    out first; if one of them can't be carried out in full, a
+    TransactionError is raised and nothing is changed. If the block raises,
+    the staged operations are dropped.
+    """
+    inventory_handler: InventoryHandler
+    # (is_give, inventory_id, item, count)
+    operations: list[tuple[bool, UUID, Item, int]]
+
+
+    def __init__(self, inventory_handler: InventoryHandler) -> Transaction:
+        self.inventory_handler = inventory_handler
+        self.operations = []
+
+
+    def __enter__(self) -> Transaction:
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.operations.clear()
+
+
+    def give(self, inventory_id: UUID, item: Item, count: int=1) -> None:
+        """Stage adding Items to an inventory."""
+        assert count >= 0
+        self.operations.append((True, inventory_id, item, count))
+
+
+    def take(self, inventory_id: UUID, item: Item, count: int=1) -> None:
+        """Stage removing Items from an inventory."""
+        assert count >= 0
+        self.operations.append((False, inventory_id, item, count))
+
+
+    def transfer(self, source_id: UUID, target_id: UUID, item: Item, count: int=1) -> None:
+        """Stage moving Items from one inventory to another."""
+        self.take(source_id, item, count)
+        self.give(target_id, item, count)
+
+
+    def commit(self) -> None:
+        """Apply every staged operation, or none of them."""
+        staged = self.operations
+        self.operations = []
+
+        # in concurrent mode, nobody else gets to touch these inventories
+        # (or the containers that are moved) until everything is applied
+        with self.inventory_handler.locked(*{inventory_id for _, inventory_id, _, _ in staged},
+                                           *_container_ids(item for _, _, item, _ in staged)):
+            self._apply([(is_give, self.inventory_handler.get(inventory_id), item, count)
+                         for is_give, inventory_id, item, count in staged])
+
+
+    def _apply(self, operations: list[tuple[bool, Inventory | SlotInventory, Item, int]]) -> None:
+        # Try everything out on stand-ins first, so a transaction that can't
+        # be carried out doesn't change anything. (Undoing isn't always
+        # possible: taking back what was given to a SlotInventory empties its
+        # highest stacks, which needn't be the ones the give started, so
+        # there can be less room left for giving back what was taken.)
+        plans = {}
+        # container inventory -> where it would be (by id)
+        parents = {}
+        for is_give, inventory, item, count in operations:
+            plan = plans.get(id(inventory))
+            if plan is None:
+                plan = plans[id(inventory)] = _plan_for(inventory)
+
+            if is_give:
+                if isinstance(item, ContainerItem) and count > 0:
+                    inner = item.inventory
+                    if id(inner) not in parents:
+                        _check_container(inventory, item, count)
+                    elif parents[id(inner)] is not None:
+                        raise ContainerError(f"'{item.name}' can only be in one place at a time")
+                    else:
+                        # taken out earlier in the transaction
+                        _check_container(inventory, item, count, source=inner.parent)
+                    parents[id(inner)] = inventory
+                if plan.give(item, count) < count:
+                    raise TransactionError(f"'{inventory.name}' doesn't have space for {count}x {item}")
+            else:
+                if plan.take(item, count) < count:
+                    raise TransactionError(f"'{inventory.name}' doesn't contain {count}x {item}")
+                if isinstance(item, ContainerItem) and count > 0:
+                    parents[id(item.inventory)] = None
+
+        applied = []
+        for is_give, inventory, item, count in operations:
+            if is_give:
+                try:
+                    done = count - inventory.give(item, count)
+                except ContainerError:
+                    self._rollback(applied)
+                    raise
+            else:
+                done = inventory.take(item, count)
+            applied.append((is_give, inventory, item, done))
+
+            if done < count:
+                # shouldn't happen after planning; undo as well as possible
+                self._rollback(applied)
+                if is_give:
+                    raise TransactionError(f"'{inventory.name}' doesn't have space for {count}x {item}")
+                raise TransactionError(f"'{inventory.name}' doesn't contain {count}x {item}")
+
+
+    @staticmethod
+    def _rollback(applied: list[tuple[bool, Inventory | SlotInventory, Item, int]]) -> None:
+        # Only needed if something fails that planning didn't see coming.
+        # Anything given is still there to be taken, but for a SlotInventory
+        # giving back what was taken can fail (see _apply())
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Rolling back %s operations", len(applied))
+        for is_give, inventory, item, count in reversed(applied):
+            if is_give:
+                undone = inventory.take(item, count)
+            else:
+                undone = count - inventory.give(item, count)
+
+            if undone < count:
+                log.error("Failed to roll back %sx %s in '%s'", count, item, inventory.name)
+
+
+def _plan_for(inventory: Inventory | SlotInventory) -> _SlotsPlan | _ContentsPlan:
+    if isinstance(inventory, SlotInventory):
+        return _SlotsPlan(inventory)
+    return _ContentsPlan(inventory)
+
+
+class _SlotsPlan(object):
+    """Stand-in for a SlotInventory that works out what give() and take()
+    would do, slot for slot, without changing anything.
+
+    Only copies the stacks of the Items it's asked about (and the free slots
+    once it needs them). Automatic compaction is left out; it only ever
+    makes more room.
+    """
+
+    def __init__(self, inventory: SlotInventory) -> _SlotsPlan:
+        self.inventory = inventory
+        # Item -> [[slot index, count]], sorted by slot
+        self.stacks: dict[Item, list[list[int]]] = {}
+        self.free_slots: list[int] | None = None
+
+
+    def _stacks(self, item: Item) -> list[list[int]]:
+        stacks = self.stacks.get(item)
+        if stacks is None:
+            slots = self.inventory.slots
+            stacks = self.stacks[item] = [[index, slots[index].count]
+                                          for index in self.inventory._stacks.get(item, ())]
+        return stacks
+
+
+    def _free_slots(self) -> list[int]:
+        if self.free_slots is None:
+            self.free_slots = list(self.inventory._free_slots)
+        return self.free_slots
+
+
+    def give(self, item: Item, count: int) -> int:
+        """Return how many would fit."""
+        stacks = self._stacks(item)
+        remaining = count
+
+        # partial stacks first, lowest slot first
+        for stack in stacks:
+            if remaining == 0:
+                break
+            added = min(remaining, item.stack_size - stack[1])
+            stack[1] += added
+            remaining -= added
+
+        # then new stacks in the lowest empty slots
+        if remaining > 0:
+            free_slots = self._free_slots()
+            while remaining > 0 and len(free_slots) > 0:
+                added = min(remaining, item.stack_size)
+                insort(stacks, [heappop(free_slots), added])
+                remaining -= added
+
+        return count - remaining
+
+
+    def take(self, item: Item, count: int) -> int:
+        """Return how many would be taken."""
+        stacks = self._stacks(item)
+        taken = 0
+
+        # from the highest slots first
+        while taken < count and len(stacks) > 0:
+            stack = stacks[-1]
+            removed = min(stack[1], count - taken)
+            stack[1] -= removed
+            taken += removed
+            if stack[1] == 0:
+                stacks.pop()
+                heappush(self._free_slots(), stack[0])
+
+        return taken
+
+
+class _ContentsPlan(object):
+    """Stand-in for a slotless Inventory (or LimitedInventory); see _SlotsPlan."""
+
+    def __init__(self, inventory: Inventory) -> _ContentsPlan:
+        self.inventory = inventory
+        self.amounts: dict[Item, int] = {}
+        if isinstance(inventory, LimitedInventory):
+            self.mass_room, self.volume_room = _room(inventory)
+        else:
+            self.mass_room = self.volume_room = math.inf
+
+
+    def give(self, item: Item, count: int) -> int:
+        accepted = _accept(item, count, self.mass_room, self.volume_room)
+        self.mass_room -= accepted * item.mass
+        self.volume_room -= accepted * item.volume
+        self.amounts[item] = self.amounts.get(item, self.inventory.amount(item)) + accepted
+        return accepted
+
+
+    def take(self, item: Item, count: int) -> int:
+        amount = self.amounts.get(item, self.inventory.amount(item))
+        taken = min(count, amount)
+        self.mass_room += taken * item.mass
+        self.volume_room += taken * item.volume
+        self.amounts[item] = amount - taken
+        return taken
+
+
 class InventoryInterface(object):
     """Contains methods allowing the player to interact with an inventory."""
     inventory: Inventory | SlotInventory
@@ -70,25 +438,60 @@ class InventoryInterface(object):
     # this seems less error-prone (I can't mess up the indeces because they're
     # one element)
     actions: tuple[(str, Callable)]
+    # where everything meant for the player goes
+    output: Callable[[str], None]
+    # where the player's input comes from (works like input(); see get_input)
+    read: Callable[[str], str] | None
 
 
-    def __init__(self, inventory_handler: InventoryHandler, inventory_id: UUID):
+    def __init__(self, inventory_handler: InventoryHandler, inventory_id: UUID,
+                 output: Callable[[str], None]=print, read: Callable[[str], str] | None=None):
         self.inventory_handler = inventory_handler
         self.inventory_id = inventory_id
         self.inventory = inventory_handler.get(inventory_id)
+        self.output = output
+        self.read = read
+        # list_items() only shows one page of a big inventory
+        self.page = 0
         self.actions = (
         # ("Command Name", self.command),
         # TODO
         ("Back", NotImplemented),
         ("List Contents", self.list_items),
         ("Transfer Items", self.transfer),
+        ("Next Page", self.next_page),
+        ("Previous Page", self.previous_page),
 
         )
 
 
+    def page_count(self) -> int:
+        if isinstance(self.inventory, SlotInventory):
+            return render.page_count(self.inventory.slot_count)
+        return render.page_count(self.inventory.occupied_slots)
+
+
     def list_items(self) -> None:
-        """Print the inventory's contents to the console."""
-        print(self.inventory.__str__())
+        """Print the current page of the inventory's contents to the console."""
+        page_count = self.page_count()
+        # the inventory might have shrunk since the last page was shown
+        self.page = min(self.page, page_count - 1)
+        start, stop = render.page_window(self.page)
+
+        with render.Buffer(self.output) as buffer:
+            self.inventory.render(buffer, start, stop)
+            if page_count > 1:
+                buffer.line(f"  Page {self.page + 1}/{page_count}")
+
+
+    def next_page(self) -> None:
+        self.page = min(self.page + 1, self.page_count() - 1)
+        self.list_items()
+
+
+    def previous_page(self) -> None:
+        self.page = max(self.page - 1, 0)
+        self.list_items()
 
 
     def list_actions(self, template: str="  {}: {}") -> None:
@@ -96,23 +499,37 @@ class InventoryInterface(object):
         # probably not needed
         assert len(self.actions) > 0
 
-        result = "Available actions:"
-
-        for i, (action_name, action) in enumerate(self.actions):
-            result += "\n" + template.format(i, action_name)
-
-        print(result)
+        with render.Buffer(self.output) as buffer:
+            buffer.line("Available actions:")
+            buffer.lines(render.list_rows([action_name for action_name, action in self.actions],
+                                          template=template))
 
 
     def get_user_action(self) -> Callable:
-        choice_index = get_input(int, True, (0, len(self.actions) - 1))
+        choice_index = get_input(int, True, (0, len(self.actions) - 1), read=self.read)
 
         return self.actions[choice_index][1]
 
 
-    def open(self) -> None:
+    def open(self) -> bool:
+        """Let the player pick and carry out one action. Returns False if they chose "Back"."""
         self.list_actions()
-        self.get_user_action()()
+        action = self.get_user_action()
+        if action is NotImplemented:
+            return False
+
+        action()
+        return True
+
+
+    def run(self) -> None:
+        """Keep opening the interface until the player goes back or the input runs out."""
+        try:
+            while self.open():
+                pass
+        except EOFError:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Input for '%s' ended", self.inventory.name)
 
 
     def get_inventories(self) -> list[UUID]:
@@ -122,45 +539,105 @@ class InventoryInterface(object):
         return inventories
 
 
-    def printlist(data: list | tuple, header: str="Data:", start_offset: int=1,
-                  _filter: Callable=lambda d: True,
+    def printlist(self, data: list | tuple, header: str="Data:", start_offset: int=1,
+                  _filter: Callable=None,
                   processor: Callable=None, template: str="  {}: {}") -> None:
 
-        result = ""
-        for i, entry in enumerate(data):
-            if not _filter(entry):
-                continue
-            if processor is not None:
-                processed_entry = processor(entry)
-            else:
-                processed_entry = entry
+        with render.Buffer(self.output) as buffer:
+            buffer.line(header)
+            buffer.lines(render.list_rows(data, start_offset, _filter, processor, template))
 
-            result += "\n" + template.format(i + start_offset, processed_entry)
 
-
-
-    def list_inventories(self, template: str="  {}: {}") -> None:
+    def list_inventories(self, template: str="  {}: {} ({})") -> None:
         inventories = self.inventory_handler.list_ids()
         inventories.remove(self.inventory_id)
 
-        result = "Accessible inventories:"
-
-        for i, uuid in enumerate(inventories):
-            result += "\n" + template.format(i + 1, self.inventory_handler.get(uuid).name)
-
-        print(result)
+        with render.Buffer(self.output) as buffer:
+            buffer.line("Accessible inventories:")
+            buffer.lines(template.format(i + 1, inventory.name, _occupancy(inventory))
+                         for i, inventory in enumerate(map(self.inventory_handler.get, inventories)))
 
 
     def transfer(self) -> None:
         self.list_items()
 
-        # TODO: implement occupied_slots() for both inv types
-
         self.list_inventories()
 
         #TODO: implement choosing inventory
 
 
+def _occupancy(inventory: Inventory | SlotInventory) -> str:
+    """Describe how full an inventory is, for listings."""
+    if isinstance(inventory, SlotInventory):
+        return f"{inventory.occupied_slots}/{inventory.slot_count} slots"
+    kinds = inventory.occupied_slots
+    return f"{kinds} item type" if kinds == 1 else f"{kinds} item types"
+
+
+class AsyncInventoryInterface(InventoryInterface):
+    """InventoryInterface for a player connected through an asyncio stream.
+
+    Waiting for input doesn't block the event loop, so one process can serve
+    lots of players at once, e.g.:
+
+        async def session(reader, writer):
+            await AsyncInventoryInterface(handler, inventory_id, reader, writer).run()
+        server = await asyncio.start_server(session, port=4000)
+
+    Without a writer, output is printed (for use with get_input.stdin_reader()).
+    """
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter | None
+
+
+    def __init__(self, inventory_handler: InventoryHandler, inventory_id: UUID,
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter | None=None):
+        super().__init__(inventory_handler, inventory_id, output=self._write)
+        self.reader = reader
+        self.writer = writer
+
+
+    def _write(self, text: str) -> None:
+        if self.writer is None:
+            print(text)
+        else:
+            # buffered until the next drain(), which happens before every read
+            self.writer.write(f"{text}\n".encode("utf-8"))
+
+
+    async def get_user_action(self) -> Callable:
+        choice_index = await get_input_async(self.reader, int, True, (0, len(self.actions) - 1),
+                                             writer=self.writer)
+
+        return self.actions[choice_index][1]
+
+
+    async def open(self) -> bool:
+        """Let the player pick and carry out one action. Returns False if they chose "Back"."""
+        self.list_actions()
+        action = await self.get_user_action()
+        if action is NotImplemented:
+            return False
+
+        # actions can be plain methods or coroutines
+        result = action()
+        if isinstance(result, Awaitable):
+            await result
+        if self.writer is not None:
+            await self.writer.drain()
+        return True
+
+
+    async def run(self) -> None:
+        """Keep opening the interface until the player goes back or disconnects."""
+        try:
+            while await self.open():
+                pass
+        except (EOFError, ConnectionError):
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Session for '%s' ended", self.inventory.name)
+
+
 
 
 
@@ -170,26 +647,150 @@ class InventoryInterface(object):
 
 
 class InventoryHandler(NamedTuple):
-    """Stores inventories on behalf of immutable objects (like Items)."""
+    """Stores inventories on behalf of immutable objects (like Items).
+
+    Registered inventories report every change to their contents to the
+    handler (see _on_change()), which keeps the optional extras below in sync.
+
+    In concurrent mode (_init(concurrent=True)) every inventory gets a lock.
+    Go through the handler's give(), take(), transfer() etc. (or hold
+    locked() yourself) when changing inventories from several threads; those
+    take the locks of every inventory involved in UUID order, so two
+    transfers can't deadlock. The shared tables (locations, store, journal
+    and the cached masses of parent inventories) are updated under the
+    handler's own lock. Reads like get(), list_ids(), locate() and total()
+    don't lock at all.
+    """
     inventories: dict[UUID, Inventory | SlotInventory]
+    # Item -> {inventory UUID: count}, for finding where things are
+    locations: dict[Item, dict[UUID, int]]
+    # NumPy mirror of all contents for bulk queries (see columnar.py)
+    store: ColumnarStore | None = None
+    # records every change for cheap autosaves (see journal.py)
+    journal: Journal | None = None
+    # inventory UUID -> lock, in concurrent mode
+    locks: dict[UUID, threading.RLock] | None = None
+    # guards the shared tables, in concurrent mode; always taken last
+    lock: threading.RLock | None = None
+    # change events for subscribers, delivered by flush_events() (see events.py)
+    events: EventBus | None = None
 
 
     @staticmethod
-    def _init() -> InventoryHandler:
+    def _init(columnar: bool=False, journal: Journal | None=None, concurrent: bool=False,
+              events: bool=False) -> InventoryHandler:
         inventories = {}
+        locations = {}
 
-        return InventoryHandler(inventories)
+        if concurrent:
+            locks = {}
+            lock = threading.RLock()
+        else:
+            locks = None
+            lock = None
+
+        if columnar:
+            try:
+                from .columnar import ColumnarStore
+            except ImportError:
+                from columnar import ColumnarStore
+            store = ColumnarStore()
+        else:
+            store = None
+
+        if events:
+            # only imported when needed, like the columnar store (see benchmarks/import_time.py)
+            try:
+                from .events import EventBus
+            except ImportError:
+                from events import EventBus
+            event_bus = EventBus()
+        else:
+            event_bus = None
 
+        return InventoryHandler(inventories, locations, store, journal, locks, lock, event_bus)
 
-    def add(self, inventory: Inventory | SlotInventory) -> UUID:
-        """Add an inventory to the handler."""
-        reference_id = uuid4()
 
-        self.inventories[reference_id] = inventory
+    @contextmanager
+    def locked(self, *reference_ids: UUID) -> Iterator[None]:
+        """Hold the locks of the given inventories (in concurrent mode; otherwise does nothing).
+
+        The locks are taken in UUID order, the same order every other method
+        takes them in, which rules out deadlocks between them.
+        """
+        if self.locks is None:
+            yield
+            return
+
+        locks = []
+        for reference_id in sorted(set(reference_ids)):
+            lock = self.locks.get(reference_id)
+            if lock is None:
+                raise InventoryNotFoundError(f"Could not find inventory with UUID {reference_id}")
+            locks.append(lock)
+
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+    def add(self, inventory: Inventory | SlotInventory, reference_id: UUID | None=None) -> UUID:
+        """Add an inventory to the handler.
+
+        A new UUID is generated unless one is given (e.g. when loading a save).
+        Raises ValueError if there already is an inventory with that UUID.
+        """
+        if reference_id is None:
+            reference_id = uuid4()
+
+        if self.lock is None:
+            self._add(inventory, reference_id)
+        else:
+            with self.lock:
+                # the lock has to be there as soon as the inventory is, but
+                # a duplicate (which _add() refuses) keeps the one it has
+                if reference_id not in self.inventories:
+                    self.locks[reference_id] = threading.RLock()
+                self._add(inventory, reference_id)
 
         return reference_id
 
 
+    def _add(self, inventory: Inventory | SlotInventory, reference_id: UUID) -> None:
+        if reference_id in self.inventories:
+            # replacing it would leave its Items in the lookup tables
+            raise ValueError(f"There already is an inventory with UUID {reference_id}")
+
+        self.inventories[reference_id] = inventory
+        inventory._handler = self
+        inventory._id = reference_id
+
+        # catch up on whatever was in there before it was registered
+        for item, count in inventory.counts().items():
+            self._index(reference_id, item, count)
+
+        if self.journal is not None:
+            self.journal.add(reference_id, inventory)
+        if self.events is not None:
+            if isinstance(inventory, SlotInventory):
+                inventory._dirty_slots = set()
+            self.events.added(reference_id)
+
+
+    def add_container(self, name: str, base_mass: float,
+                      inventory: Inventory | SlotInventory, volume: float=0.0) -> ContainerItem:
+        """Add an inventory to the handler and return a ContainerItem for it."""
+        reference_id = self.add(inventory)
+
+        return ContainerItem(name, base_mass, reference_id, self, volume)
+
+
     def get(self, reference_id) -> Inventory | SlotInventory:
         """Return the inventory stored under the given reference."""
         if reference_id in self.inventories.keys():
@@ -199,13 +800,224 @@ class InventoryHandler(NamedTuple):
 
 
     def remove(self, reference_id) -> None:
-        """Add an inventory from the handler."""
-        log.debug(f"Deleting reference to '{self.get(reference_id).name}' for {reference_id}")
+        """Remove an inventory from the handler.
+
+        Raises ContainerError if it's the inventory of a container that's
+        inside another inventory; take the container out first.
+        """
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Deleting reference to '%s' for %s", self.get(reference_id).name, reference_id)
+
+        if self.lock is None:
+            self._remove(reference_id)
+        else:
+            # wait for whoever is using it to finish
+            with self.locked(reference_id), self.lock:
+                self._remove(reference_id)
+                del self.locks[reference_id]
+
+
+    def _remove(self, reference_id) -> None:
+        inventory = self.get(reference_id)
+        if inventory.parent is not None:
+            # the container would be left behind pointing at an inventory that
+            # no longer exists
+            raise ContainerError(f"Can't remove '{inventory.name}' while its container is in '{inventory.parent.name}'")
+
+        for item, count in inventory.counts().items():
+            self._index(reference_id, item, -count)
+
         del self.inventories[reference_id]
+        inventory._handler = None
+        inventory._id = None
+
+        if self.journal is not None:
+            self.journal.remove(reference_id)
+        if self.events is not None:
+            if isinstance(inventory, SlotInventory):
+                inventory._dirty_slots = None
+            self.events.removed(reference_id)
+
+
+    def _on_change(self, reference_id: UUID, item: Item, delta: int) -> None:
+        """Called by registered inventories whenever the amount of an Item in them changes.
+
+        In concurrent mode the caller holds self.lock (see _on_given()).
+        """
+        self._index(reference_id, item, delta)
+
+        if self.journal is not None:
+            self.journal.change(reference_id, item, delta)
+        if self.events is not None:
+            self.events.change(reference_id, item, delta)
+
+
+    def _on_arrange(self, reference_id: UUID, order: list[Item]) -> None:
+        """Called by registered SlotInventories when their stacks were laid out
+        again (see SlotInventory.compact())."""
+        if self.journal is None and self.events is None:
+            return
+        if self.lock is None:
+            self._arranged(reference_id, order)
+        else:
+            with self.lock:
+                self._arranged(reference_id, order)
+
+
+    def _arranged(self, reference_id: UUID, order: list[Item]) -> None:
+        if self.journal is not None:
+            self.journal.arrange(reference_id, order)
+        if self.events is not None:
+            self.events.arrange(reference_id)
+
+
+    def flush_events(self) -> int:
+        """Deliver the change events collected since the last call to their subscribers.
+
+        Call it once per tick; see events.py. Returns how many events there
+        were.
+        """
+        if self.events is None:
+            raise RuntimeError("flush_events() needs an InventoryHandler created with events=True")
+        # already imported by _init()
+        try:
+            from .events import slot_events
+        except ImportError:
+            from events import slot_events
+
+        if self.lock is None:
+            events, touched = self.events.collect()
+        else:
+            with self.lock:
+                events, touched = self.events.collect()
+
+        for reference_id in touched:
+            inventory = self.inventories.get(reference_id)
+            if not isinstance(inventory, SlotInventory):
+                continue
+            if self.locks is None:
+                events.extend(slot_events(reference_id, inventory))
+            else:
+                lock = self.locks.get(reference_id)
+                if lock is not None:
+                    with lock:
+                        events.extend(slot_events(reference_id, inventory))
+
+        self.events.deliver(events)
+        return len(events)
+
+
+    def _index(self, reference_id: UUID, item: Item, delta: int) -> None:
+        """Update the lookup tables after the amount of an Item in an inventory changed."""
+        locations = self.locations.get(item)
+        if locations is None:
+            locations = self.locations[item] = {}
+
+        count = locations.get(reference_id, 0) + delta
+        if count > 0:
+            locations[reference_id] = count
+        else:
+            del locations[reference_id]
+            if len(locations) == 0:
+                del self.locations[item]
+
+        if self.store is not None:
+            self.store.change(reference_id, item, delta)
+
+
+    def bulk_update(self, items: Collection[Item], update: Callable) -> int:
+        """Change the counts of items in every inventory at once, e.g. to make food rot.
+
+        update gets a NumPy array of counts and returns the new counts (fewer
+        or more; anything that doesn't fit is dropped). Needs the columnar
+        store. The changes go through the inventories' give()/take(), so
+        everything stays consistent. Returns how many stacks changed.
+        """
+        if self.store is None:
+            raise RuntimeError("bulk_update() needs an InventoryHandler created with columnar=True")
+
+        if self.lock is None:
+            changes = self.store.plan_update(items, update)
+        else:
+            with self.lock:
+                changes = self.store.plan_update(items, update)
+
+        # in concurrent mode, each change is applied on its own
+        for reference_id, item, delta in changes:
+            if delta > 0:
+                self.give(reference_id, item, delta)
+            else:
+                self.take(reference_id, item, -delta)
+
+        return len(changes)
+
+
+    def locate(self, item: Item) -> dict[UUID, int]:
+        """Return the UUIDs of the inventories holding an Item, and how many each holds."""
+        return dict(self.locations.get(item, {}))
+
+
+    def total(self, item: Item) -> int:
+        """Return how many of an Item there are across all inventories."""
+        return sum(self.locations.get(item, {}).values())
+
+
+    def transaction(self) -> Transaction:
+        """Start a Transaction on the inventories of this handler."""
+        return Transaction(self)
+
+
+    def give(self, reference_id: UUID, item: Item, count: int=1) -> int:
+        """Add Items to an inventory; returns how many didn't fit."""
+        with self.locked(reference_id, *_container_ids((item,))):
+            return self.get(reference_id).give(item, count)
+
+
+    def take(self, reference_id: UUID, item: Item, count: int=1) -> int:
+        """Remove Items from an inventory; returns how many were removed."""
+        with self.locked(reference_id, *_container_ids((item,))):
+            return self.get(reference_id).take(item, count)
+
+
+    def transfer(self, source_id: UUID, target_id: UUID, item: Item, count: int=1) -> None:
+        """Move Items from one inventory to another (as many as there are and fit)."""
+        with self.locked(source_id, target_id, *_container_ids((item,))):
+            self.get(source_id).transfer(self.get(target_id), item, count)
+
+
+    def transfer_many(self, source_id: UUID, target_id: UUID,
+                      items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> list[TransferResult]:
+        """Move several Items from one inventory to another; see SlotInventory.transfer_many()."""
+        items = _merge_counts(items)
+        with self.locked(source_id, target_id, *_container_ids(items)):
+            return self.get(source_id).transfer_many(self.get(target_id), items)
+
+
+    def transfer_all(self, source_id: UUID, target_id: UUID) -> list[TransferResult]:
+        """Move as much as possible from one inventory to another."""
+        # the containers in the source have to be locked too, but they're only
+        # known once the source is; try again if they weren't all locked
+        container_ids = set()
+        while True:
+            with self.locked(source_id, target_id, *container_ids):
+                source = self.get(source_id)
+                found = set(_container_ids(source.counts()))
+                if found <= container_ids:
+                    return source.transfer_all(self.get(target_id))
+            container_ids = found
+
+
+    def ancestors(self, reference_id: UUID) -> list[UUID]:
+        """Return the UUIDs of the inventories the given one is inside, innermost first.
+
+        Takes O(depth). Inventories that aren't registered are left out.
+        """
+        return [ancestor._id for ancestor in self.get(reference_id).ancestors() if ancestor._handler is self]
 
 
     def list_ids(self) -> list[UUID]:
         """Return a list of UUIDs for all inventories registered in this InventoryHandler."""
+        # copying a dict's keys is atomic in CPython, so this doesn't need a lock
         return list(self.inventories.keys())
 
 
@@ -216,25 +1028,108 @@ class InventoryHandler(NamedTuple):
         interface.open()
 
 
-    def _choose_inv(self) -> None:
+    def _choose_inv(self, read: Callable[[str], str] | None=None, output: Callable[[str], None]=print) -> None:
         inventory_ids = self.list_ids()
         print_list(inventory_ids, offset=1, processor=lambda i: self.get(i).name,
-                   header="Available inventories:")
+                   header="Available inventories:", output=output)
         if len(inventory_ids) <= 0:
             return
-        choice = get_input(int, True, (1, len(inventory_ids)))
+        choice = get_input(int, True, (1, len(inventory_ids)), read=read)
 
         inventory_id = inventory_ids[choice - 1]
-        interface = InventoryInterface(self, inventory_id)
+        interface = InventoryInterface(self, inventory_id, output, read)
 
         interface.open()
 
 
 
-class Item(NamedTuple):
+class ItemRegistry(object):
+    """Interns Item definitions, so there's only one Item for each of them."""
+    # in order of registration
+    items: list[Item]
+
+
+    def __init__(self) -> ItemRegistry:
+        self.items = []
+        self._lookup: dict[tuple[str, int, float, float], Item] = {}
+
+
+    def __repr__(self) -> str:
+        return f"ItemRegistry({len(self.items)} items)"
+
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+    def __iter__(self) -> Iterator[Item]:
+        return iter(self.items)
+
+
+    def register(self, name: str, stack_size: int, base_mass: float, volume: float=0.0) -> Item:
+        """Return the Item with the given definition, creating it if needed."""
+        key = (name, stack_size, base_mass, volume)
+        item = self._lookup.get(key)
+
+        if item is None:
+            item = _ItemDefinition.__new__(Item, name, stack_size, base_mass, volume)
+            self._lookup[key] = item
+            self.items.append(item)
+
+        return item
+
+
+class _ItemDefinition(NamedTuple):
     name: str
     stack_size: int
     base_mass: float
+    # space a single one takes up; only LimitedInventory cares
+    volume: float = 0.0
+
+
+class Item(_ItemDefinition):
+    """Definition of an item (not an amount of it; see ItemStack).
+
+    Items are interned: Item(name, stack_size, base_mass, volume) returns the
+    one Item with that definition from item_registry, so two equal Items are always the
+    same object. That means they can be compared and hashed by identity, which
+    is a lot cheaper than going through the whole tuple every time.
+    """
+
+    def __new__(cls, name: str, stack_size: int, base_mass: float, volume: float=0.0) -> Item:
+        return item_registry.register(name, stack_size, base_mass, volume)
+
+
+    # NamedTuple's versions of these would create a second, equal Item
+    @classmethod
+    def _make(cls, iterable: Iterable) -> Item:
+        return item_registry.register(*iterable)
+
+
+    def _replace(self, **changes) -> Item:
+        result = self._make(map(changes.pop, self._fields, self))
+        if changes:
+            raise ValueError(f"Got unexpected field names: {list(changes)!r}")
+        return result
+
+
+    def __eq__(self, other) -> bool:
+        # dicts check identity before calling this, so it's rarely needed
+        return self is other
+
+
+    def __ne__(self, other) -> bool:
+        return self is not other
+
+
+    __hash__ = object.__hash__
+
+
+    def __reduce__(self) -> tuple:
+        # pickle just the definition, so the Item is interned again when it's
+        # unpickled
+        return Item, tuple(self)
+
 
     @property
     def mass(self) -> float:
@@ -252,18 +1147,76 @@ class Item(NamedTuple):
 
 
 class ContainerItem(Item):
-    """An item with an inventory."""
+    """An item with an inventory.
+
+    Containers don't stack (stack_size is always 1) and two containers are only
+    equal if they share an inventory. Use InventoryHandler.add_container() to
+    create one.
+    """
     inventory_id: UUID
+    inventory_handler: InventoryHandler
+
+    def __new__(cls, name: str, base_mass: float, inventory_id: UUID,
+                inventory_handler: InventoryHandler, volume: float=0.0) -> ContainerItem:
+        # the volume is the container's own; it doesn't grow with the contents
+        self = _ItemDefinition.__new__(cls, name, 1, base_mass, volume)
+        self.inventory_id = inventory_id
+        self.inventory_handler = inventory_handler
+        return self
+
 
     @property
     def inventory(self) -> Inventory | SlotInventory:
         """Fetch the Item's associated inventory."""
-        global inventory_handler
+        return self.inventory_handler.get(self.inventory_id)
+
+
+    @property
+    def mass(self) -> float:
+        """Returns base mass + mass of the contents."""
+        return self.base_mass + self.inventory.mass
+
+
+    def __repr__(self) -> str:
+        return f"ContainerItem(name='{self.name}', base_mass={self.base_mass}, inventory_id={self.inventory_id})"
+
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ContainerItem):
+            return self.inventory_id == other.inventory_id
+        return False
+
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+
+    def __hash__(self) -> int:
+        return hash(self.inventory_id)
+
+
+    def __reduce__(self) -> tuple:
+        # it would drag the whole InventoryHandler along
+        raise TypeError("ContainerItems can't be pickled; save their InventoryHandler with snapshot.py instead")
+
+
+    # every container is unique (and tied to its inventory), so there's
+    # nothing to make one from
+    @classmethod
+    def _make(cls, iterable: Iterable) -> ContainerItem:
+        raise TypeError("Use InventoryHandler.add_container() to create a ContainerItem")
+
+
+    def _replace(self, **changes) -> ContainerItem:
+        raise TypeError("ContainerItems can't be copied; use InventoryHandler.add_container() for a new one")
+
 
-        return inventory_handler.get(self.inventory_id)
+item_registry = ItemRegistry()
 
 
 class ItemStack(object):
+    # no per-instance __dict__; there can be a *lot* of these
+    __slots__ = ("item", "count")
     item: Item
     count: int
 
@@ -285,7 +1238,8 @@ class ItemStack(object):
 
 
     def __init__(self, item: Item, count: int=1) -> ItemStack:
-        log.debug(f"Creating ItemStack of {count}x {item.name}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Creating ItemStack of %sx %s", count, item.name)
 
         self.item = item
         if count > item.stack_size:
@@ -299,7 +1253,8 @@ class ItemStack(object):
         if self.count + count > self.item.stack_size:
             # (Item)Stack Overflow :)
             remainder = self.count + count - self.item.stack_size
-            log.debug(f"Can't add {count}x {self.item} to a stack of {self.count}; pushing {remainder} to next available slot")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Can't add %sx %s to a stack of %s; pushing %s to next available slot", count, self.item, self.count, remainder)
             self.count = self.item.stack_size
             return remainder
         else:
@@ -318,7 +1273,8 @@ class ItemStack(object):
         else:
             removed = self.count
             remainder = count - self.count
-            log.debug(f"Can't remove {count}x {self.item} from a stack of {self.count}; pulling {remainder} from next available slot")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Can't remove %sx %s from a stack of %s; pulling %s from next available slot", count, self.item, self.count, remainder)
             self.count = 0
 
         return removed
@@ -328,54 +1284,87 @@ class SlotInventory(object):
     name: str
     slot_count: int
     slots: list[ItemStack | None]
+    # the inventory holding this one's ContainerItem, if any; see ancestors()
+    parent: Inventory | SlotInventory | None
+    # compact() automatically once fragmentation goes above this (None = never)
+    auto_compact: float | None
 
     @property
     def is_empty(self) -> bool:
         """Check if the Inventory is empty."""
-        result = True
-        for slot in self.slots:
-            if slot is None:
-                continue
-            else:
-                result = False
-                break
-        return result
+        return len(self._free_slots) == self.slot_count
+
+    @property
+    def occupied_slots(self) -> int:
+        """Return how many slots hold a stack."""
+        return self.slot_count - len(self._free_slots)
+
+    @property
+    def free_slots(self) -> int:
+        """Return how many slots are empty."""
+        return len(self._free_slots)
 
     @property
     def mass(self) -> float:
-        """Tally up the mass of contained Items."""
+        """Return the mass of contained Items (including the contents of containers).
+
+        The mass is kept up to date by give() and take(), so this doesn't need
+        to go through the slots.
+        """
+        if DEBUG_CACHES:
+            _check_mass(self)
+        return self._mass
+
+
+    def _recompute_mass(self) -> float:
+        """Tally up the mass of contained Items, ignoring any cached values."""
         result = 0.0
         for slot in self.slots:
             if slot is None:
                 continue
             else:
-                result += slot.mass
+                result += slot.count * _item_mass(slot.item)
         return result
 
 
+    @property
+    def fragmentation(self) -> float:
+        """Return the share of slots taken up by stacks compact() would merge away.
+
+        0.0 means every Item is in as few stacks as possible.
+        """
+        if self.slot_count == 0:
+            return 0.0
+        return self._extra_stacks / self.slot_count
+
+
     def __repr__(self) -> str:
         return f"SlotInventory(name='{self.name}', slot_count={self.slot_count}, slots={repr(self.slots)})"
 
 
     def __str__(self, template: str="  {}: {}") -> str:
-        content_list = []
-        for i, slot in enumerate(self.slots):
-            if slot is None:
-                continue
-            else:
-                content_list.append(template.format(i + 1, slot))
-
-        if len(content_list) > 0:
-            contents = "\n".join(content_list)
+        buffer = render.Buffer()
+        self.render(buffer, template=template)
+        return buffer.getvalue()
+
+
+    def render(self, buffer: render.Buffer, start: int=0, stop: int | None=None,
+               template: str="  {}: {}") -> None:
+        """Write the contents of slots[start:stop] to a render.Buffer."""
+        buffer.line(f"{self.name} contents:")
+        if not self.is_empty:
+            buffer.lines((template.format(i + 1, slot)
+                          for i, slot in enumerate(render.window(self.slots, start, stop), start)
+                          if slot is not None), empty="  ~Empty~")
         else:
-            contents = "  ~Empty~"
-
-        return f"{self.name} contents:\n{contents}\n  ({len(content_list)}/{self.slot_count})"
+            buffer.line("  ~Empty~")
+        buffer.line(f"  ({self.occupied_slots}/{self.slot_count})")
 
 
 
     def __init__(self, name: str="Inventory", slot_count: int=10) -> SlotInventory:
-        log.debug(f"Creating new SlotInventory '{name}' with {slot_count} slots")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Creating new SlotInventory '%s' with %s slots", name, slot_count)
         self.name = name
         self.slot_count = slot_count
 
@@ -384,6 +1373,23 @@ class SlotInventory(object):
             slots.append(None)
         self.slots = slots
 
+        # Lookup tables so give() and take() don't have to scan every slot.
+        # They're only kept up to date by give() and take(), so don't edit
+        # self.slots directly.
+        # Item -> indices of the slots holding it (sorted)
+        self._stacks: dict[Item, list[int]] = {}
+        # Item -> indices of the slots holding a stack of it that isn't full (sorted)
+        self._partial_stacks: dict[Item, list[int]] = {}
+        # heap of empty slot indices, so the lowest one is always on top
+        self._free_slots: list[int] = list(range(slot_count))
+        self._totals: Counter = Counter()
+        # how many more stacks there are than the contents strictly need
+        self._extra_stacks = 0
+        _init_tree(self)
+        self.auto_compact = None
+        # slots touched since the last InventoryHandler.flush_events(), if it has events
+        self._dirty_slots: set[int] | None = None
+
 
     def give(self, item: Item, count: int=1) -> int:
         """Add Items to the Inventory.
@@ -391,81 +1397,146 @@ class SlotInventory(object):
         Return value is how many items were leftover (i.e. how many didn't fit).
         Returns 0 if all items could fit into the inventory.
         """
-        log.debug(f"Adding {count}x {item} to '{self.name}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Adding %sx %s to '%s'", count, item, self.name)
         # this should probably be an if that throws a ValueError,
         # but this is simpler and works
         assert count >= 0
+        if isinstance(item, ContainerItem):
+            # checking where it is and linking it has to be one step
+            with _tree_lock(item):
+                _check_container(self, item, count)
+                return self._give(item, count)
+        return self._give(item, count)
 
-        # Check for partial stacks
-        for slot in self.slots:
-            if slot is None:
-                # empty stack
-                continue
 
-            elif slot.item == item:
-                count = slot.add(count)
-                if count == 0:
-                    # No overflow; everything could fit into this stack
-                    return 0
-                else:
-                    # Stack overflowed; distribute the remainder
-                    continue
-            else:
-                # different Item
-                continue
+    def _give(self, item: Item, count: int) -> int:
+        remaining = count
+        dirty_slots = self._dirty_slots
+        extra_stacks = self._item_extra_stacks(item)
 
-        # Check for empty slots
-        log.debug(f"Failed to fit items into partial stacks, distributing {count}x {item} to empty slots")
-        for i, slot in enumerate(self.slots):
-            if slot is None:
-                if count > item.stack_size:
-                    # can't fit in single stack; distribute the remainder
-                    self.slots[i] = ItemStack(item, item.stack_size)
-                    count -= item.stack_size
-                    continue
-                else:
+        # Check for partial stacks
+        partial_stacks = self._partial_stacks.get(item)
+        if partial_stacks is not None:
+            filled = 0
+            for index in partial_stacks:
+                slot = self.slots[index]
+                remaining = slot.add(remaining)
+                if dirty_slots is not None:
+                    dirty_slots.add(index)
+                if slot.count < item.stack_size:
                     # No overflow; everything could fit into this stack
-                    self.slots[i] = ItemStack(item, count)
-                    return 0
+                    break
+                filled += 1
+                if remaining == 0:
+                    break
+
+            # the ones that got filled are always at the front
+            del partial_stacks[:filled]
+            if len(partial_stacks) == 0:
+                del self._partial_stacks[item]
 
-        # Not enough room to distribute all items
-        log.debug(f"Failed to fit items into '{self.name}'; {count}x {item} left over")
-        return count
+        # Check for empty slots
+        if remaining > 0:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Failed to fit items into partial stacks, distributing %sx %s to empty slots", remaining, item)
+            free_slots = self._free_slots
+            stacks = self._stacks.get(item)
+            if stacks is None and len(free_slots) > 0:
+                stacks = self._stacks[item] = []
+
+            while remaining > 0 and len(free_slots) > 0:
+                index = heappop(free_slots)
+                # can't fit in single stack; distribute the remainder
+                stack_count = min(remaining, item.stack_size)
+                self.slots[index] = ItemStack(item, stack_count)
+                insort(stacks, index)
+                if dirty_slots is not None:
+                    dirty_slots.add(index)
+                if stack_count < item.stack_size:
+                    insort(self._partial_stacks.setdefault(item, []), index)
+                remaining -= stack_count
+
+        if count > remaining:
+            self._totals[item] += count - remaining
+            self._extra_stacks += self._item_extra_stacks(item) - extra_stacks
+            _on_given(self, item, count - remaining)
+            if self.auto_compact is not None:
+                self._maybe_compact()
+
+        if remaining > 0:
+            # Not enough room to distribute all items
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Failed to fit items into '%s'; %sx %s left over", self.name, remaining, item)
+        return remaining
 
 
     def take(self, item: Item, count: int=1) -> int:
-        log.debug(f"Removing {count}x {item} from '{self.name}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Removing %sx %s from '%s'", count, item, self.name)
         # this should probably be an if that throws a ValueError,
         # but this is simpler and works
         assert count >= 0
         taken = 0
-
-        for index, slot in enumerate(reversed(self.slots)):
-            if slot is None:
-                # empty stack
-                continue
-
-            elif slot.item == item:
-                slot_id = self.slot_count - index - 1
-                removed = slot.remove(count-taken)
-                taken += removed
+        extra_stacks = self._item_extra_stacks(item)
+
+        # Take from the highest slots first
+        stacks = self._stacks.get(item)
+        if stacks is not None:
+            partial_stacks = self._partial_stacks.get(item)
+            while taken < count and len(stacks) > 0:
+                slot_id = stacks[-1]
+                slot = self.slots[slot_id]
+                was_full = slot.count >= item.stack_size
+                taken += slot.remove(count - taken)
+                if self._dirty_slots is not None:
+                    self._dirty_slots.add(slot_id)
                 if slot.count == 0:
-                    log.debug(f"Stack in slot {slot_id} of '{self.name}' is empty; removing")
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("Stack in slot %s of '%s' is empty; removing", slot_id, self.name)
                     self.slots[slot_id] = None
+                    stacks.pop()
+                    heappush(self._free_slots, slot_id)
+                    if not was_full:
+                        # it's the highest stack, so it's the last partial one too
+                        partial_stacks.pop()
+                elif was_full:
+                    if partial_stacks is None:
+                        partial_stacks = self._partial_stacks[item] = []
+                    insort(partial_stacks, slot_id)
+
+            if len(stacks) == 0:
+                del self._stacks[item]
+            if partial_stacks is not None and len(partial_stacks) == 0:
+                del self._partial_stacks[item]
+
+        if taken > 0:
+            self._totals[item] -= taken
+            if self._totals[item] == 0:
+                del self._totals[item]
+            self._extra_stacks += self._item_extra_stacks(item) - extra_stacks
+            _on_taken(self, item, taken)
+            if self.auto_compact is not None:
+                self._maybe_compact()
+
+        if taken < count:
+            # Not enough items to take everything
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Failed to take items from '%s'; %sx %s missing", self.name, count-taken, item)
+        return taken
 
-                if taken == count:
-                    # No underflow; everything could be taken from this slot
-                    return taken
-                else:
-                    # Stack underflowed; take remainder from other slots
-                    continue
-            else:
-                # different Item
-                continue
 
-        # Not enough items to tak everything
-        log.debug(f"Failed to take items from '{self.name}'; {count-taken}x {item} missing")
-        return taken
+    def amount(self, item: Item) -> int:
+        """Return how many of an Item are in the Inventory."""
+        return self._totals[item]
+
+
+    def counts(self) -> Counter:
+        """Return how many of each Item are in the Inventory.
+
+        This is the inventory's own running tally, don't modify it.
+        """
+        return self._totals
 
 
     def contains(self, item: Item, count: int=1) -> bool:
@@ -474,82 +1545,278 @@ class SlotInventory(object):
         Useful when you want an action to be performed *only* if a sufficient
         quantity of an Item is present.
         """
-        amount = 0
-        for slot in self.slots:
-            if slot is None:
-                # empty stack
-                continue
+        return self._totals[item] >= count
 
-            elif slot.item == item:
-                amount += slot.count
-                if amount >= count:
-                    return True
-            else:
-                continue
-        return False
+
+    def deep_amount(self, item: Item) -> int:
+        """Return how many of an Item are in the Inventory, including inside its
+        containers (and their containers...)."""
+        return _deep_amount(self, item)
+
+
+    def deep_counts(self) -> Counter:
+        """Return how many of each Item are in the Inventory, including inside its containers."""
+        return _deep_counts(self)
+
+
+    def ancestors(self) -> Iterator[Inventory | SlotInventory]:
+        """Yield the inventory holding this one's container, the one holding that, and so on."""
+        return _ancestors(self)
+
+
+    def is_inside(self, inventory: Inventory | SlotInventory) -> bool:
+        """Check if this inventory's container is somewhere inside another inventory."""
+        return _is_inside(self, inventory)
 
 
     def has_space_for(self, item: Item, count: int) -> bool:
         """Check if the given SlotInventory can accept x amount of an Item."""
-        available_space = 0
+        return count <= self.max_acceptable(item)
 
-        for slot in self.slots:
-            if slot is None:
-                available_space += item.stack_size
 
-            elif slot.item == item:
-                available_space += item.stack_size - slot.count
+    def max_acceptable(self, item: Item, source: Inventory | SlotInventory | None=None) -> int:
+        """Return exactly how many of an Item would fit.
 
-            else:
-                pass
-            if available_space >= count:
-                return True
+        Worked out from the lookup tables, so it takes O(1) (O(depth) for a
+        ContainerItem, which fits at most once; see _container_room()). source
+        is where the Item would come from.
+        """
+        # every stack of the item (full or partial) plus every empty slot,
+        # minus what's already in there
+        stack_count = len(self._stacks.get(item, ()))
+        accepted = (stack_count + len(self._free_slots)) * item.stack_size - self._totals[item]
+        if isinstance(item, ContainerItem):
+            return min(accepted, _container_room(self, item, source))
+        return accepted
+
+
+    def fit_plan(self, items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> FitPlan:
+        """Work out how many of each Item would fit and which slots they'd go in.
+
+        The result is the same as giving the Items one after another
+        (duplicates are merged first), but nothing is changed, so it can be
+        used for previews. A ContainerItem that's already in an inventory (or
+        would end up inside itself) doesn't fit. Only looks at the partial
+        stacks of the Items and the empty slots that would be used.
+        """
+        requested = _merge_counts(items)
+        accepted = self._plan_accept(requested)
+
+        # give() tops up the partial stacks first, lowest slot first...
+        slots = {}
+        new_stacks = []
+        for item, count in accepted.items():
+            assignment = slots[item] = []
+            remaining = count
+            for index in self._partial_stacks.get(item, ()):
+                if remaining == 0:
+                    break
+                added = min(remaining, item.stack_size - self.slots[index].count)
+                assignment.append((index, added))
+                remaining -= added
+            new_stacks.append((item, remaining))
+
+        # ...then starts new stacks in the lowest empty slots
+        free_slots = iter(nsmallest(sum(math.ceil(remaining / item.stack_size) for item, remaining in new_stacks),
+                                    self._free_slots))
+        for item, remaining in new_stacks:
+            while remaining > 0:
+                added = min(remaining, item.stack_size)
+                slots[item].append((next(free_slots), added))
+                remaining -= added
+
+        return FitPlan(requested, accepted, slots)
+
+
+    def _load(self, stacks: Iterable[tuple[int, Item, int]]) -> None:
+        """Put stacks straight into their slots, for loading saved inventories.
+
+        Only meant for empty inventories; stacks have to be in slot order.
+        """
+        slots = self.slots
+        for index, item, count in stacks:
+            slots[index] = ItemStack(item, count)
+            self._stacks.setdefault(item, []).append(index)
+            if count < item.stack_size:
+                self._partial_stacks.setdefault(item, []).append(index)
+            self._totals[item] += count
+
+        # a sorted list is a valid heap
+        self._free_slots = [i for i, slot in enumerate(slots) if slot is None]
+        self._extra_stacks = sum(self._item_extra_stacks(item) for item in self._stacks)
+
+        for item, count in self._totals.items():
+            _on_given(self, item, count)
+
+
+    def _item_extra_stacks(self, item: Item) -> int:
+        """Return how many more stacks of an Item there are than its count needs."""
+        stacks = self._stacks.get(item)
+        if stacks is None:
+            return 0
+        # ceil() without going through floats
+        return len(stacks) + (-self._totals[item] // item.stack_size)
 
-        return False
 
+    def _maybe_compact(self) -> None:
+        if self._extra_stacks > self.auto_compact * self.slot_count:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("'%s' is %.0f%% fragmented; compacting", self.name, 100 * self.fragmentation)
+            self.compact()
 
-    def transfer(self, target: Inventory, item: Item, count: int=1) -> None:
-        log.debug(f"Transfering {count}x {item} from '{self.name}' to '{target.name}'")
 
-        actual_count = self.take(item, count)
-        if actual_count < count:
-            log.debug(f"Transfer issue: '{self.name}' only contained {actual_count}x {item} ")
+    def compact(self) -> None:
+        """Merge partial stacks and move everything to the lowest slots.
+
+        Items keep the order they first appear in. Only the layout changes;
+        the contents stay the same.
+        """
+        order = sorted(self._stacks, key=lambda item: self._stacks[item][0])
+        self._arrange(order)
+
+
+    def sort(self, key: Callable[[Item], object] | None=None, reverse: bool=False) -> None:
+        """Like compact(), but orders the Items by key (by name if not given)."""
+        if key is None:
+            key = lambda item: item.name
+        self._arrange(sorted(self._stacks, key=key, reverse=reverse))
+
+
+    def _arrange(self, order: list[Item]) -> None:
+        """Lay out the contents again, one Item after another in the given order.
+
+        Every Item gets as few stacks as possible, with its partial stack (if
+        any) last. Goes through the slots once.
+        """
+        if len(order) != len(self._stacks) or set(order) != self._stacks.keys():
+            raise ValueError("order has to list every Item in the inventory exactly once")
+
+        slots = [None] * self.slot_count
+        self._stacks.clear()
+        self._partial_stacks.clear()
+
+        index = 0
+        for item in order:
+            remaining = self._totals[item]
+            stacks = self._stacks[item] = []
+            while remaining > 0:
+                stack_count = min(remaining, item.stack_size)
+                slots[index] = ItemStack(item, stack_count)
+                stacks.append(index)
+                remaining -= stack_count
+                index += 1
+
+            if stack_count < item.stack_size:
+                self._partial_stacks[item] = [stacks[-1]]
+
+        if self._dirty_slots is not None:
+            # everything that was or is now in a slot may have moved
+            self._dirty_slots.update(i for i, slot in enumerate(self.slots) if slot is not None)
+            self._dirty_slots.update(range(index))
+        self.slots[:] = slots
+        # a sorted list is a valid heap
+        self._free_slots = list(range(index, self.slot_count))
+        self._extra_stacks = 0
+
+        if self._handler is not None:
+            self._handler._on_arrange(self._id, order)
+
+
+    def _plan_accept(self, requested: Mapping[Item, int],
+                     source: Inventory | SlotInventory | None=None) -> dict[Item, int]:
+        """Work out how many of each Item would fit if they were given in order
+        (coming from source, if given).
+
+        Doesn't change anything; used to plan batch transfers.
+        """
+        free_slots = len(self._free_slots)
+        plan = {}
+
+        for item, count in requested.items():
+            # room left in the existing stacks of this item
+            partial_space = len(self._stacks.get(item, ())) * item.stack_size - self._totals[item]
+            accepted = min(count, partial_space + free_slots * item.stack_size)
+            if isinstance(item, ContainerItem):
+                accepted = min(accepted, _container_room(self, item, source))
+            if accepted > partial_space:
+                # whatever doesn't go into partial stacks takes up empty slots
+                free_slots -= math.ceil((accepted - partial_space) / item.stack_size)
+
+            plan[item] = accepted
+
+        return plan
+
+
+    def transfer_many(self, target: Inventory | SlotInventory,
+                      items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> list[TransferResult]:
+        """Move several Items to another inventory in one go.
+
+        items can be a mapping or (item, count) pairs. The whole move is planned
+        against what this inventory holds and what the target has room for
+        before anything is moved, so nothing has to be given back.
+        """
+        return _transfer_many(self, target, items)
+
 
-        if actual_count > 0:
-            overflow = target.give(item, actual_count)
-            if overflow > 0:
-                log.debug(f"Transfer issue: '{target.name}' could only accept {actual_count-overflow}x {item}; {overflow} returned to '{self.name}'")
-                self.give(item, overflow)
+    def transfer_all(self, target: Inventory | SlotInventory) -> list[TransferResult]:
+        """Move as much of the inventory's contents as fits into the target."""
+        return _transfer_many(self, target, list(self.counts().items()))
+
+
+    def transfer(self, target: Inventory, item: Item, count: int=1) -> None:
+        """Move up to count of an Item to another inventory (as many as it has room for)."""
+        _transfer(self, target, item, count)
 
 
 class Inventory(object):
     name: str
     contents: Counter
+    # the inventory holding this one's ContainerItem, if any; see ancestors()
+    parent: Inventory | SlotInventory | None
 
     @property
     def is_empty(self) -> bool:
         """Check if the Inventory is empty."""
-        for item, count in self.contents.items():
-            # the check is probably unnecessary but eh
-            if count > 0:
-                return False
-            else:
-                log.error(f"{self.name} contains {count}x {item}")
-        return True
+        # give() and take() never leave Items with a count of 0 in contents
+        return len(self.contents) == 0
+
+    @property
+    def occupied_slots(self) -> int:
+        """Return how many different Items there are; a slotless Inventory
+        needs one "slot" for each."""
+        return len(self.contents)
+
+    @property
+    def free_slots(self) -> float:
+        """A slotless Inventory never runs out of room."""
+        return math.inf
 
     @property
     def mass(self) -> float:
-        """Tally up the mass of contained Items."""
+        """Return the mass of contained Items (including the contents of containers).
+
+        The mass is kept up to date by give() and take(), so this doesn't need
+        to go through the contents.
+        """
+        if DEBUG_CACHES:
+            _check_mass(self)
+        return self._mass
+
+
+    def _recompute_mass(self) -> float:
+        """Tally up the mass of contained Items, ignoring any cached values."""
         result = 0.0
         for item, count in self.contents.items():
-            result += item.mass * count
+            result += _item_mass(item) * count
         return result
 
 
     def __init__(self, name: str="Inventory") -> Inventory:
-        log.debug(f"Creating new Inventory '{name}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Creating new Inventory '%s'", name)
         self.name = name
         self.contents = Counter()
+        _init_tree(self)
 
 
     def __repr__(self) -> str:
@@ -557,16 +1824,19 @@ class Inventory(object):
 
 
     def __str__(self, template: str="  {}: {}x {}") -> str:
-        content_list = []
-        for i, (item, count) in enumerate(self.contents.items()):
-            # TODO add padding
-            content_list.append(template.format(i + 1, count, item))
+        buffer = render.Buffer()
+        self.render(buffer, template=template)
+        return buffer.getvalue()
 
-        if len(content_list) > 0:
-            contents = "\n".join(content_list)
-        else:
-            contents = "  ~Empty~"
-        return f"{self.name} contents:\n{contents}"
+
+    def render(self, buffer: render.Buffer, start: int=0, stop: int | None=None,
+               template: str="  {}: {}x {}") -> None:
+        """Write the start-th to stop-th Items to a render.Buffer."""
+        buffer.line(f"{self.name} contents:")
+        # TODO add padding
+        buffer.lines((template.format(i + 1, count, item)
+                      for i, (item, count) in enumerate(render.window(self.contents.items(), start, stop), start)),
+                     empty="  ~Empty~")
 
 
     def give(self, item: Item, count: int=1) -> int:
@@ -575,19 +1845,31 @@ class Inventory(object):
         Return value is how many items were leftover (i.e. how many didn't fit).
         Returns 0 if all items could fit into the inventory.
         """
-        log.debug(f"Adding {count}x {item} to '{self.name}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Adding %sx %s to '%s'", count, item, self.name)
         # this should probably be an if that throws a ValueError,
         # but this is simpler and works
         assert count >= 0
+        if isinstance(item, ContainerItem):
+            # checking where it is and linking it has to be one step
+            with _tree_lock(item):
+                _check_container(self, item, count)
+                if count > 0:
+                    self.contents[item] += count
+                    _on_given(self, item, count)
+            return 0
 
-        self.contents[item] += count
+        if count > 0:
+            self.contents[item] += count
+            _on_given(self, item, count)
         # Compared to SlotInventory, this is comically short
         return 0
 
 
     def take(self, item: Item, count: int=1) -> int:
         """Remove items from the inventory and return how many were removed."""
-        log.debug(f"Removing {count}x {item} from '{self.name}'")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Removing %sx %s from '%s'", count, item, self.name)
         # this should probably be an if that throws a ValueError,
         # but this is simpler and works
         assert count >= 0
@@ -599,30 +1881,35 @@ class Inventory(object):
         else:
             taken = self.contents[item]
             remainder = count - self.contents[item]
-            log.debug(f"Failed to take items from '{self.name}'; {remainder}x {item} missing")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Failed to take items from '%s'; %sx %s missing", self.name, remainder, item)
             self.contents[item] = 0
 
         if self.contents[item] == 0:
             del self.contents[item]
 
+        if taken > 0:
+            _on_taken(self, item, taken)
+
         return taken
         # return remainder
 
 
     def transfer(self, target: Inventory, item: Item, count: int=1) -> None:
-        log.debug(f"Transfering {count}x {item} from '{self.name}' to '{target.name}'")
+        """Move up to count of an Item to another inventory (as many as it has room for)."""
+        _transfer(self, target, item, count)
+
 
-        actual_count = self.take(item, count)
-        if actual_count < count:
-            log.debug(f"Transfer issue: '{self.name}' only contained {actual_count}x {item} ")
 
-        if actual_count > 0:
-            overflow = target.give(item, actual_count)
-            if overflow > 0:
-                log.debug(f"Transfer issue: '{target.name}' could only accept {actual_count-overflow}x {item}; {overflow} returned to '{self.name}'")
-                self.give(item, overflow)
+    def amount(self, item: Item) -> int:
+        """Return how many of an Item are in the Inventory."""
+        return self.contents[item]
 
 
+    def counts(self) -> Counter:
+        """Return how many of each Item are in the Inventory (don't modify it)."""
+        return self.contents
+
 
     def contains(self, item: Item, count: int=1) -> bool:
         """Check if the given Inventory has the specified amount of an item.
@@ -633,6 +1920,27 @@ class Inventory(object):
         return self.contents[item] >= count
 
 
+    def deep_amount(self, item: Item) -> int:
+        """Return how many of an Item are in the Inventory, including inside its
+        containers (and their containers...)."""
+        return _deep_amount(self, item)
+
+
+    def deep_counts(self) -> Counter:
+        """Return how many of each Item are in the Inventory, including inside its containers."""
+        return _deep_counts(self)
+
+
+    def ancestors(self) -> Iterator[Inventory | SlotInventory]:
+        """Yield the inventory holding this one's container, the one holding that, and so on."""
+        return _ancestors(self)
+
+
+    def is_inside(self, inventory: Inventory | SlotInventory) -> bool:
+        """Check if this inventory's container is somewhere inside another inventory."""
+        return _is_inside(self, inventory)
+
+
     def has_space_for(self, item: Item, count: int) -> bool:
         """Check if the given Inventory can accept x amount of an Item.
 
@@ -641,11 +1949,455 @@ class Inventory(object):
         """
         # kinda pointless for a slotless Inventory, but will be needed for
         # SlotInventory, so might as well have it here so I don't need separate
-        # logic for slotted and slotless inventories
-        return True
+        # logic for slotted and slotless inventories.
+        # Only a container can be turned away.
+        return count <= self.max_acceptable(item)
+
+
+    def max_acceptable(self, item: Item, source: Inventory | SlotInventory | None=None) -> int | float:
+        """Return how many of an Item would fit; a slotless Inventory has no limit
+        except for containers (see SlotInventory.max_acceptable())."""
+        if isinstance(item, ContainerItem):
+            return _container_room(self, item, source)
+        return math.inf
+
+
+    def fit_plan(self, items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> FitPlan:
+        """Work out how many of each Item would fit; see SlotInventory.fit_plan()."""
+        requested = _merge_counts(items)
+        return FitPlan(requested, self._plan_accept(requested), None)
+
+
+    def _load(self, contents: Iterable[tuple[Item, int]]) -> None:
+        """Add Items without any checks or logging, for loading saved inventories."""
+        for item, count in contents:
+            self.contents[item] += count
+
+        for item, count in self.contents.items():
+            _on_given(self, item, count)
+
+
+    def _plan_accept(self, requested: Mapping[Item, int],
+                     source: Inventory | SlotInventory | None=None) -> dict[Item, int]:
+        """Work out how many of each Item would fit; for a slotless Inventory
+        that's all of them, except for containers that can't go in."""
+        return {item: min(count, _container_room(self, item, source)) if isinstance(item, ContainerItem) else count
+                for item, count in requested.items()}
+
+
+    def transfer_many(self, target: Inventory | SlotInventory,
+                      items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> list[TransferResult]:
+        """Move several Items to another inventory in one go.
+
+        See SlotInventory.transfer_many().
+        """
+        return _transfer_many(self, target, items)
+
+
+    def transfer_all(self, target: Inventory | SlotInventory) -> list[TransferResult]:
+        """Move as much of the inventory's contents as fits into the target."""
+        return _transfer_many(self, target, list(self.counts().items()))
+
+
+class LimitedInventory(Inventory):
+    """A slotless Inventory that can only carry so much mass and/or volume.
+
+    For encumbrance. The mass is cached anyway and the volume is kept as a
+    running total too, so checking how much fits takes O(1). give() takes as
+    many as fit and returns how many didn't, like SlotInventory.give().
+
+    Only what's given to the inventory itself is checked: Items put into a
+    container that's already inside count towards the mass, but aren't
+    refused, so the inventory can end up over its limit (and then accepts
+    nothing that has mass until enough is taken out).
+    """
+    max_mass: float
+    max_volume: float
+
+    @property
+    def volume(self) -> float:
+        """Return the total volume of the contained Items (containers count with their own volume)."""
+        return self._volume
+
+    @property
+    def free_mass(self) -> float:
+        """Return how much more mass fits."""
+        return max(0.0, self.max_mass - self._mass)
+
+    @property
+    def free_volume(self) -> float:
+        """Return how much more volume fits."""
+        return max(0.0, self.max_volume - self._volume)
+
+
+    def __init__(self, name: str="Inventory", max_mass: float=math.inf,
+                 max_volume: float=math.inf) -> LimitedInventory:
+        super().__init__(name)
+        self.max_mass = max_mass
+        self.max_volume = max_volume
+        self._volume = 0.0
+
+
+    def __repr__(self) -> str:
+        return (f"LimitedInventory(name='{self.name}', max_mass={self.max_mass}, max_volume={self.max_volume}, "
+                f"contents={self.contents})")
+
+
+    def give(self, item: Item, count: int=1) -> int:
+        """Add as many Items as fit; returns how many didn't."""
+        assert count >= 0
+        # not max_acceptable(), so a container that can't go in still raises in super().give()
+        accepted = _accept(item, count, self.max_mass - self._mass, self.max_volume - self._volume)
+        if accepted < count:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("'%s' can only carry %s more of %sx %s", self.name, accepted, count, item)
+
+        super().give(item, accepted)
+        self._volume += accepted * item.volume
+        return count - accepted
+
+
+    def take(self, item: Item, count: int=1) -> int:
+        taken = super().take(item, count)
+        if len(self.contents) == 0:
+            # don't let rounding errors pile up
+            self._volume = 0.0
+        else:
+            self._volume -= taken * item.volume
+        return taken
+
+
+    def has_space_for(self, item: Item, count: int) -> bool:
+        """Check if the LimitedInventory can accept x amount of an Item."""
+        return count <= self.max_acceptable(item)
+
+
+    def max_acceptable(self, item: Item, source: Inventory | SlotInventory | None=None) -> int | float:
+        """Return exactly how many of an Item would fit (math.inf if it has no
+        mass or volume), in O(1); see SlotInventory.max_acceptable()."""
+        accepted = _accept(item, math.inf, *_room(self))
+        if isinstance(item, ContainerItem):
+            return min(accepted, _container_room(self, item, source))
+        return accepted
+
+
+    def _load(self, contents: Iterable[tuple[Item, int]]) -> None:
+        contents = list(contents)
+        super()._load(contents)
+        self._volume = sum(count * item.volume for item, count in contents)
+
+
+    def _plan_accept(self, requested: Mapping[Item, int],
+                     source: Inventory | SlotInventory | None=None) -> dict[Item, int]:
+        """Work out how many of each Item would fit if they were given in order."""
+        mass_room, volume_room = _room(self)
+        plan = {}
+
+        for item, count in requested.items():
+            accepted = _accept(item, count, mass_room, volume_room)
+            if isinstance(item, ContainerItem):
+                accepted = min(accepted, _container_room(self, item, source))
+            mass_room -= accepted * item.mass
+            volume_room -= accepted * item.volume
+            plan[item] = accepted
+
+        return plan
+
+
+def _room(inventory: LimitedInventory) -> tuple[float, float]:
+    """Return how much more mass and volume a LimitedInventory can take (negative if it's over)."""
+    return inventory.max_mass - inventory._mass, inventory.max_volume - inventory._volume
+
+
+def _accept(item: Item, count: int | float, mass_room: float, volume_room: float) -> int | float:
+    """Return how many of count Items fit into the given mass and volume."""
+    return min(count, _fits(mass_room, item.mass), _fits(volume_room, item.volume))
+
+
+def _fits(room: float, size: float) -> int | float:
+    """Return how many things of a size fit into room (math.inf if they take up none)."""
+    if size <= 0 or room == math.inf:
+        return math.inf
+    if room <= 0:
+        return 0
+    # a little slack, so rounding errors don't turn e.g. 0.3 / 0.1 into 2
+    return math.floor(room / size + 1e-9)
+
+
+def _transfer(source: Inventory | SlotInventory, target: Inventory | SlotInventory, item: Item,
+              count: int) -> None:
+    """Move up to count of an Item between two inventories; see Inventory.transfer()."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Transfering %sx %s from '%s' to '%s'", count, item, source.name, target.name)
+
+    actual_count = min(count, source.amount(item))
+    if actual_count < count:
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Transfer issue: '%s' only contained %sx %s ", source.name, actual_count, item)
+
+    if isinstance(item, ContainerItem):
+        # in one go, so nobody else can move it in between
+        with _tree_lock(item):
+            # first, so putting it inside itself raises instead of just not fitting
+            _check_container(target, item, actual_count, source=source)
+            _move(source, target, item, actual_count)
+    else:
+        _move(source, target, item, actual_count)
+
+
+def _move(source: Inventory | SlotInventory, target: Inventory | SlotInventory, item: Item,
+          count: int) -> None:
+    # check how much fits first, so nothing has to be given back
+    accepted = min(count, target.max_acceptable(item, source))
+    if accepted < count:
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Transfer issue: '%s' could only accept %sx %s; %s left in '%s'", target.name, accepted, item, count-accepted, source.name)
+
+    if accepted > 0:
+        source.take(item, accepted)
+        target.give(item, accepted)
+
+
+def _transfer_many(source: Inventory | SlotInventory, target: Inventory | SlotInventory,
+                   items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> list[TransferResult]:
+    """Plan and carry out a batch transfer between two inventories."""
+    # cap each one at what the source actually has
+    requested = _merge_counts(items)
+    available = {item: min(count, source.amount(item)) for item, count in requested.items()}
+
+    containers = [item for item, count in available.items() if count > 0 and isinstance(item, ContainerItem)]
+
+    results = []
+    # containers are checked, planned and moved in one go, like in transfer()
+    with _tree_lock(containers[0]) if len(containers) > 0 else nullcontext():
+        for item in containers:
+            _check_container(target, item, available[item], source=source)
+
+        plan = target._plan_accept(available, source)
+        for item, count in requested.items():
+            moved = plan[item]
+            if moved > 0:
+                source.take(item, moved)
+                target.give(item, moved)
+            results.append(TransferResult(item, count, moved))
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Transfered %s items of %s types from '%s' to '%s'", sum(plan.values()), len(plan), source.name, target.name)
+    return results
+
+
+def _merge_counts(items: Mapping[Item, int] | Iterable[tuple[Item, int]]) -> dict[Item, int]:
+    """Return {Item: count} for a mapping or (Item, count) pairs, adding up duplicate entries."""
+    if isinstance(items, Mapping):
+        items = items.items()
+
+    merged = {}
+    for item, count in items:
+        assert count >= 0
+        merged[item] = merged.get(item, 0) + count
+    return merged
+
+
+def _item_mass(item: Item) -> float:
+    """Return the mass of an Item without using cached inventory masses."""
+    if isinstance(item, ContainerItem):
+        return item.base_mass + item.inventory._recompute_mass()
+    return item.mass
+
+
+def _check_mass(inventory: Inventory | SlotInventory) -> None:
+    """Compare an inventory's cached mass against a full recompute."""
+    expected = inventory._recompute_mass()
+    if not math.isclose(inventory._mass, expected, rel_tol=1e-9, abs_tol=1e-9):
+        log.error("Cached mass of '%s' is %s, should be %s", inventory.name, inventory._mass, expected)
+        raise AssertionError(f"Cached mass of '{inventory.name}' is {inventory._mass}, should be {expected}")
+
+
+def _change_mass(inventory: Inventory | SlotInventory, delta: float) -> None:
+    """Add delta to the cached mass of an inventory and every container it's in."""
+    while inventory is not None:
+        inventory._mass += delta
+        inventory = inventory.parent
+
+
+def _change_contents(inventory: Inventory | SlotInventory, item: Item, count: int) -> None:
+    """Update the cached mass of an inventory and every container it's in, and
+    their nested counts, after the count of an Item in it changed by count.
+
+    Same as _change_mass() and _change_nested_counts() together, but only
+    walks up once; this runs on every give() and take().
+    """
+    delta = count * item.mass
+    inventory._mass += delta
+    inventory = inventory.parent
+    while inventory is not None:
+        inventory._mass += delta
+        nested_counts = inventory._nested_counts
+        nested_count = nested_counts.get(item, 0) + count
+        if nested_count != 0:
+            nested_counts[item] = nested_count
+        else:
+            del nested_counts[item]
+        inventory = inventory.parent
+
+
+def _change_nested_counts(inventory: Inventory | SlotInventory | None, counts: Mapping[Item, int],
+                          sign: int) -> None:
+    """Add (or with sign=-1, subtract) counts to the nested counts of an inventory
+    and every container it's in."""
+    while inventory is not None:
+        nested_counts = inventory._nested_counts
+        for item, count in counts.items():
+            nested_count = nested_counts.get(item, 0) + sign * count
+            if nested_count != 0:
+                nested_counts[item] = nested_count
+            else:
+                del nested_counts[item]
+        inventory = inventory.parent
+
+
+def _check_nested_counts(inventory: Inventory | SlotInventory) -> None:
+    """Compare an inventory's nested counts against a full recount."""
+    expected = Counter()
+    for item in inventory.counts():
+        if isinstance(item, ContainerItem):
+            expected.update(item.inventory.deep_counts())
+    if expected != Counter(inventory._nested_counts):
+        log.error("Nested counts of '%s' are %s, should be %s", inventory.name, inventory._nested_counts, expected)
+        raise AssertionError(f"Nested counts of '{inventory.name}' are out of date")
+
+
+def _init_tree(inventory: Inventory | SlotInventory) -> None:
+    """Set up the cached values and links both kinds of inventory have."""
+    inventory._mass = 0.0
+    # everything inside the containers in here (and inside those...);
+    # a plain dict, since it's updated for every level on every change
+    # and Counter's methods are a lot slower
+    inventory._nested_counts = {}
+    inventory.parent = None
+    # set by InventoryHandler.add()
+    inventory._handler = None
+    inventory._id = None
+
+
+def _deep_amount(inventory: Inventory | SlotInventory, item: Item) -> int:
+    return inventory.amount(item) + inventory._nested_counts.get(item, 0)
+
+
+def _deep_counts(inventory: Inventory | SlotInventory) -> Counter:
+    if DEBUG_CACHES:
+        _check_nested_counts(inventory)
+    counts = inventory.counts().copy()
+    counts.update(inventory._nested_counts)
+    return counts
+
+
+def _ancestors(inventory: Inventory | SlotInventory) -> Iterator[Inventory | SlotInventory]:
+    inventory = inventory.parent
+    while inventory is not None:
+        yield inventory
+        inventory = inventory.parent
+
+
+def _is_inside(inventory: Inventory | SlotInventory, other: Inventory | SlotInventory) -> bool:
+    return any(ancestor is other for ancestor in _ancestors(inventory))
+
+
+def _check_container(target: Inventory | SlotInventory, item: ContainerItem, count: int,
+                     source: Inventory | SlotInventory | None=None) -> None:
+    """Raise ContainerError if count of a ContainerItem can't go into target.
+
+    A container can only be in one place (so only one of it, and it can't
+    already be in an inventory other than source) and can't go inside itself.
+    Walks up from target, so it takes O(depth).
+    """
+    if count == 0:
+        return
+    inner = item.inventory
+    if count > 1 or (inner.parent is not None and inner.parent is not source):
+        raise ContainerError(f"'{item.name}' can only be in one place at a time")
+    if inner is target or any(ancestor is inner for ancestor in _ancestors(target)):
+        raise ContainerError(f"Can't put '{item.name}' inside itself")
+
+
+def _container_room(target: Inventory | SlotInventory, item: ContainerItem,
+                    source: Inventory | SlotInventory | None=None) -> int:
+    """Return how many of a ContainerItem target could take as far as the
+    container rules go: 1, or 0 if it's already in an inventory other than
+    source or target is inside it. Same rules as _check_container()."""
+    inner = item.inventory
+    if inner.parent is not None and inner.parent is not source:
+        return 0
+    if inner is target or any(ancestor is inner for ancestor in _ancestors(target)):
+        return 0
+    return 1
+
+
+def _container_ids(items: Iterable[Item]) -> list[UUID]:
+    """Return the UUIDs of the inventories of the ContainerItems among items.
+
+    A container's contents are read while it's moved, so in concurrent mode
+    its inventory has to be locked along with the source and target.
+    """
+    return [item.inventory_id for item in items if isinstance(item, ContainerItem)]
+
+
+def _tree_lock(item: ContainerItem) -> threading.RLock | nullcontext:
+    """Return the lock to hold while checking where a container goes and moving it there.
+
+    That's the lock of the handler its inventory is in (every container
+    tree is in one handler); otherwise two threads could each check a move
+    before the other one is done and, say, put two bags inside each other.
+    """
+    lock = item.inventory_handler.lock
+    return nullcontext() if lock is None else lock
+
+
+def _on_given(inventory: Inventory | SlotInventory, item: Item, count: int) -> None:
+    """Update cached values after count Items were added to an inventory."""
+    handler = inventory._handler
+    if handler is not None and handler.lock is not None:
+        # parents' masses and the handler's tables are shared between threads
+        with handler.lock:
+            _given(inventory, item, count)
+    else:
+        _given(inventory, item, count)
+
+
+def _given(inventory: Inventory | SlotInventory, item: Item, count: int) -> None:
+    if isinstance(item, ContainerItem):
+        inner = item.inventory
+        inner.parent = inventory
+        # everything in the container is now inside this inventory too
+        _change_nested_counts(inventory, inner.deep_counts(), 1)
+    _change_contents(inventory, item, count)
+    if inventory._handler is not None:
+        inventory._handler._on_change(inventory._id, item, count)
+
+
+def _on_taken(inventory: Inventory | SlotInventory, item: Item, count: int) -> None:
+    """Update cached values after count Items were removed from an inventory."""
+    handler = inventory._handler
+    if handler is not None and handler.lock is not None:
+        with handler.lock:
+            _taken(inventory, item, count)
+    else:
+        _taken(inventory, item, count)
+
+
+def _taken(inventory: Inventory | SlotInventory, item: Item, count: int) -> None:
+    _change_contents(inventory, item, -count)
+    if isinstance(item, ContainerItem):
+        inner = item.inventory
+        _change_nested_counts(inventory, inner.deep_counts(), -1)
+        inner.parent = None
+    if inventory._handler is not None:
+        inventory._handler._on_change(inventory._id, item, -count)
 
 
 if __name__ == "__main__":
+    setup_logging()
+
     inv = Inventory("Test Inventory")
 
     IH = InventoryHandler._init()
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""Write-ahead journal of inventory changes, for cheap autosaves
+
+Instead of writing a full snapshot every autosave, an InventoryHandler with
+a Journal appends a small record for every change (give, take, transfer,
+add and remove all boil down to these). Once the journal gets big enough
+it's compacted: a new snapshot is written and the journal starts over. After
+a crash, recover() loads the last snapshot and replays the journal on top.
+
+Records (after a "BNBJ" + version + generation header), each starting with
+a one-byte code:
+    I  Item definition (same layout as in a snapshot); gets the next item index
+    K  UUID of an inventory that was already in the snapshot; gets the next
+       inventory index
+    A  inventory added to the handler (same layout as in a snapshot, so
+       including its contents); gets the next inventory index
+    R  inventory index removed from the handler
+    C  inventory index, item index, change in count
+    L  inventory index, item count, item indices; the SlotInventory was
+       compacted or sorted into that order of Items
+
+Replaying give()/take() with the recorded counts puts every stack back in
+the same slot, so apart from L records the journal doesn't need to know
+about slots.
+
+The generation in the header is the one of the snapshot the journal goes
+on top of. Compacting writes the new snapshot with a new generation before
+the journal is started over, so if the game crashes in between, recover()
+can tell that the journal was already folded into the snapshot and skips it
+instead of applying it twice.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from array import array
+from typing import BinaryIO
+from uuid import UUID
+import logging
+import os
+import random
+import struct
+
+try:
+    from .inventory import InventoryHandler, Inventory, SlotInventory, Item
+    from . import snapshot
+except ImportError:
+    from inventory import InventoryHandler, Inventory, SlotInventory, Item
+    import snapshot
+
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"BNBJ"
+VERSION = 1
+
+# magic, version, generation of the snapshot it goes on top of
+_HEADER = struct.Struct("<4sHQ")
+# code, inventory index, item index, change in count
+_CHANGE = struct.Struct("<cIIq")
+# code, inventory index
+_REMOVE = struct.Struct("<cI")
+# code, UUID
+_KNOWN = struct.Struct("<c16s")
+# code, inventory index, item count (followed by that many uint32 item indices)
+_ARRANGE = struct.Struct("<cII")
+
+
+class Journal(object):
+    """Append-only record of every change made to the inventories of an InventoryHandler.
+
+    Pass it to InventoryHandler._init() (or use recover()). The file is only
+    created when the first record is written, and is started over (truncated)
+    when that happens, so replay an old journal with recover() first.
+    """
+    path: str | os.PathLike
+    snapshot_path: str | os.PathLike
+    # compact once the journal is bigger than this many bytes
+    compact_size: int
+    # records are only written while this is True
+    recording: bool
+    # generation of the snapshot the journal goes on top of (0: none)
+    generation: int
+
+
+    def __init__(self, path: str | os.PathLike, snapshot_path: str | os.PathLike,
+                 compact_size: int=4 * 2**20) -> Journal:
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.compact_size = compact_size
+        self.recording = True
+        self.generation = 0
+
+        self._file: BinaryIO | None = None
+        # indices used by the records in the current file
+        self._items: dict[Item, int] = {}
+        self._inventories: dict[UUID, int] = {}
+
+
+    def __repr__(self) -> str:
+        return f"Journal(path='{self.path}', snapshot_path='{self.snapshot_path}', size={self.size})"
+
+
+    @property
+    def size(self) -> int:
+        """How many bytes have been written to the journal file so far."""
+        if self._file is None:
+            return 0
+        return self._file.tell()
+
+
+    def _start(self) -> None:
+        """Start a new, empty journal file."""
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, self.generation))
+        self._items.clear()
+        self._inventories.clear()
+
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None:
+            self._start()
+        self._file.write(data)
+
+
+    def _item(self, item: Item) -> int:
+        index = self._items.get(item)
+        if index is None:
+            self._write(b"I" + snapshot._encode_item(item))
+            index = self._items[item] = len(self._items)
+        return index
+
+
+    def _inventory(self, reference_id: UUID) -> int:
+        index = self._inventories.get(reference_id)
+        if index is None:
+            # registered before the journal started, so it's in the snapshot
+            self._write(_KNOWN.pack(b"K", reference_id.bytes))
+            index = self._inventories[reference_id] = len(self._inventories)
+        return index
+
+
+    def change(self, reference_id: UUID, item: Item, delta: int) -> None:
+        """Record that the count of an Item in an inventory changed by delta."""
+        if not self.recording:
+            return
+        # look these up first; they might have to write records of their own
+        item_index = self._item(item)
+        inventory_index = self._inventory(reference_id)
+        self._write(_CHANGE.pack(b"C", inventory_index, item_index, delta))
+
+
+    def arrange(self, reference_id: UUID, order: list[Item]) -> None:
+        """Record that a SlotInventory laid out its stacks again in the given order of Items."""
+        if not self.recording:
+            return
+        item_indices = array("I", [self._item(item) for item in order])
+        inventory_index = self._inventory(reference_id)
+        self._write(_ARRANGE.pack(b"L", inventory_index, len(item_indices)) + snapshot._to_bytes(item_indices))
+
+
+    def add(self, reference_id: UUID, inventory: Inventory | SlotInventory) -> None:
+        """Record that an inventory (and its current contents) was added."""
+        if not self.recording:
+            return
+        data = snapshot._encode_inventory(reference_id, inventory, self._item)
+        self._write(b"A" + data)
+        self._inventories[reference_id] = len(self._inventories)
+
+
+    def remove(self, reference_id: UUID) -> None:
+        """Record that an inventory was removed."""
+        if not self.recording:
+            return
+        self._write(_REMOVE.pack(b"R", self._inventory(reference_id)))
+
+
+    def flush(self, sync: bool=False) -> None:
+        """Push buffered records to the OS (and to the disk, if sync is True)."""
+        if self._file is None:
+            return
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+
+    def compact(self, handler: InventoryHandler) -> None:
+        """Write a full snapshot of handler and start the journal over."""
+        if handler.lock is None:
+            self._compact(handler)
+        else:
+            # in concurrent mode, nothing may change between writing the
+            # snapshot and starting the new journal
+            with handler.locked(*handler.list_ids()), handler.lock:
+                self._compact(handler)
+        log.info("Compacted journal into %s", self.snapshot_path)
+
+
+    def _compact(self, handler: InventoryHandler) -> None:
+        # random, so it can't match a journal from some other save either
+        generation = random.getrandbits(64) or 1
+        temporary_path = f"{self.snapshot_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            snapshot.save(handler, file, generation)
+            file.flush()
+            os.fsync(file.fileno())
+        # only replace the old snapshot once the new one is safely written
+        os.replace(temporary_path, self.snapshot_path)
+        _sync_directory(self.snapshot_path)
+
+        # from here on the old journal is outdated, even if it's still there
+        self.generation = generation
+        self._start()
+        self.flush(sync=True)
+        self.recording = True
+
+
+    def autosave(self, handler: InventoryHandler) -> bool:
+        """Make the journal durable, compacting it if it got too big.
+
+        Meant to be called regularly (e.g. every few seconds) from the game
+        loop. Returns True if it compacted.
+        """
+        if self.size >= self.compact_size:
+            self.compact(handler)
+            return True
+
+        self.flush(sync=True)
+        return False
+
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _sync_directory(path: str | os.PathLike) -> None:
+    """Make sure a rename in the directory of path is on the disk, not just the file."""
+    if os.name == "nt":
+        # can't open directories there (and NTFS journals renames anyway)
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replay(path: str | os.PathLike, handler: InventoryHandler, generation: int | None=None) -> int:
+    """Apply the records of a journal file to handler and return how many were applied.
+
+    Stops at the first incomplete or unreadable record, which after a crash
+    is usually the one that was being written. If a generation is given, a
+    journal that doesn't go on top of the snapshot of that generation is
+    skipped.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+
+    view = memoryview(data)
+    try:
+        magic, version, journal_generation = _HEADER.unpack_from(view, 0)
+    except struct.error:
+        log.warning("Journal %s has no header; nothing to replay", path)
+        return 0
+    if magic != MAGIC:
+        raise snapshot.SnapshotError(f"{path} is not a journal")
+    if version != VERSION:
+        raise snapshot.SnapshotError(f"Unsupported journal version {version}")
+
+    if generation is not None and journal_generation != generation:
+        log.warning("Journal %s is from generation %s, the snapshot from %s; not replaying it",
+                    path, journal_generation, generation)
+        return 0
+
+    offset = _HEADER.size
+    items = []
+    inventories = []
+    applied = 0
+
+    while offset < len(view):
+        code = bytes(view[offset:offset + 1])
+        try:
+            if code == b"C":
+                _, inventory_index, item_index, delta = _CHANGE.unpack_from(view, offset)
+                offset += _CHANGE.size
+                _replay_change(handler, inventories[inventory_index], items[item_index], delta)
+
+            elif code == b"I":
+                item, offset = snapshot._read_item(view, offset + 1, handler)
+                items.append(item)
+
+            elif code == b"K":
+                _, raw_id = _KNOWN.unpack_from(view, offset)
+                offset += _KNOWN.size
+                inventories.append(UUID(bytes=raw_id))
+
+            elif code == b"A":
+                reference_id, inventory, offset = snapshot._read_inventory(view, offset + 1, items)
+                handler.add(inventory, reference_id)
+                inventories.append(reference_id)
+
+            elif code == b"L":
+                _, inventory_index, item_count = _ARRANGE.unpack_from(view, offset)
+                item_indices, offset = snapshot._read_array("I", view, offset + _ARRANGE.size, item_count)
+                handler.get(inventories[inventory_index])._arrange([items[i] for i in item_indices])
+
+            elif code == b"R":
+                _, inventory_index = _REMOVE.unpack_from(view, offset)
+                offset += _REMOVE.size
+                handler.remove(inventories[inventory_index])
+
+            else:
+                raise snapshot.SnapshotError(f"Unknown record {code!r}")
+
+        # SnapshotError is a ValueError too
+        except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+            log.warning("Journal %s is unreadable after %s records (%s); ignoring the rest", path, applied, e)
+            break
+
+        applied += 1
+
+    return applied
+
+
+def _replay_change(handler: InventoryHandler, reference_id: UUID, item: Item, delta: int) -> None:
+    inventory = handler.get(reference_id)
+    if delta > 0:
+        leftover = inventory.give(item, delta)
+        if leftover > 0:
+            log.warning("Replay: %sx %s didn't fit into '%s'", leftover, item, inventory.name)
+    else:
+        taken = inventory.take(item, -delta)
+        if taken < -delta:
+            log.warning("Replay: '%s' was missing %sx %s", inventory.name, -delta - taken, item)
+
+
+def recover(snapshot_path: str | os.PathLike, journal_path: str | os.PathLike,
+            columnar: bool=False, compact_size: int=4 * 2**20, concurrent: bool=False,
+            events: bool=False) -> InventoryHandler:
+    """Load the last snapshot, replay the journal on top of it and start a new journal.
+
+    Either file may be missing (e.g. when starting a new world). Returns an
+    InventoryHandler that records into the new journal.
+    """
+    journal = Journal(journal_path, snapshot_path, compact_size)
+    # don't record what's being restored
+    journal.recording = False
+
+    if os.path.exists(snapshot_path):
+        handler = snapshot.load(snapshot_path, columnar=columnar, journal=journal, concurrent=concurrent,
+                                events=events)
+        journal.generation = snapshot.read_generation(snapshot_path)
+    else:
+        handler = InventoryHandler._init(columnar=columnar, journal=journal, concurrent=concurrent, events=events)
+
+    if os.path.exists(journal_path):
+        # a journal that was already folded into the snapshot is skipped
+        applied = replay(journal_path, handler, journal.generation)
+        log.info("Replayed %s journal records from %s", applied, journal_path)
+
+    # fold everything into a fresh snapshot; this also turns recording back on
+    journal.compact(handler)
+    return handler
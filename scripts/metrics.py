@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Opt-in call counts, timings and stacks touched for the hot inventory operations
+
+Nothing is measured until enable() is called. It swaps the methods listed
+in INSTRUMENTED for wrappers that count calls, add up the time spent in
+them and how many stacks they touched; disable() puts the original methods
+back. So when metrics are off there's no overhead at all.
+
+    metrics = enable()
+    ...
+    metrics.write_prometheus("/var/lib/node_exporter/bnb.prom")
+    disable()
+
+Stacks touched are counted through ItemStack: every stack an operation adds
+to, removes from or creates counts as one. Times and stacks touched are
+inclusive, so a transfer also counts the give() and take() it does. A method
+that goes on to its base class's version with super() (like
+LimitedInventory.give()) is only counted once, under the class of the
+inventory. Counting isn't synchronized, so in concurrent mode the numbers
+are approximate.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator
+import json
+import os
+import time
+
+try:
+    from .inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, ItemStack
+except ImportError:
+    from inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, ItemStack
+
+
+# class -> methods that get timed
+INSTRUMENTED = {
+    Inventory: ("give", "take", "contains", "has_space_for", "max_acceptable", "fit_plan",
+                "transfer", "transfer_many", "transfer_all"),
+    SlotInventory: ("give", "take", "contains", "has_space_for", "max_acceptable", "fit_plan",
+                    "transfer", "transfer_many", "transfer_all", "compact", "sort"),
+    LimitedInventory: ("give", "take", "has_space_for", "max_acceptable"),
+    InventoryHandler: ("add", "remove", "give", "take", "transfer", "transfer_many", "transfer_all",
+                       "locate", "total"),
+}
+# ItemStack methods that count as touching a stack
+TOUCHES = ("__init__", "add", "remove")
+
+
+class Metrics(object):
+    """Counters collected while instrumentation is enabled, by "Class.method"."""
+    calls: dict[str, int]
+    seconds: dict[str, float]
+    stacks_touched: dict[str, int]
+
+
+    def __init__(self) -> Metrics:
+        self.calls = {}
+        self.seconds = {}
+        self.stacks_touched = {}
+        # running total of ItemStacks touched, for working out stacks_touched
+        self._touched = 0
+        # (inventory or handler, method name) of the instrumented calls in progress
+        self._running: set[tuple[int, str]] = set()
+
+
+    def __repr__(self) -> str:
+        return f"Metrics(operations={len(self.calls)}, calls={sum(self.calls.values())})"
+
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.seconds.clear()
+        self.stacks_touched.clear()
+
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """Return the current counters as {"Class.method": {"calls", "seconds", "stacks_touched"}}."""
+        return {name: {"calls": self.calls[name],
+                       "seconds": self.seconds.get(name, 0.0),
+                       "stacks_touched": self.stacks_touched.get(name, 0)}
+                for name in sorted(self.calls)}
+
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+
+    def to_prometheus(self, prefix: str="bnb_inventory") -> str:
+        """Return the counters in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for metric, key, description in ((f"{prefix}_calls_total", "calls", "Calls per operation"),
+                                         (f"{prefix}_seconds_total", "seconds", "Time spent per operation"),
+                                         (f"{prefix}_stacks_touched_total", "stacks_touched",
+                                          "Stacks touched per operation")):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, values in snapshot.items():
+                lines.append(f'{metric}{{operation="{name}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+
+    def write_json(self, path: str | os.PathLike) -> None:
+        _write_atomically(path, self.to_json() + "\n")
+
+
+    def write_prometheus(self, path: str | os.PathLike, prefix: str="bnb_inventory") -> None:
+        """Write the counters for e.g. node_exporter's textfile collector."""
+        _write_atomically(path, self.to_prometheus(prefix))
+
+
+def _write_atomically(path: str | os.PathLike, text: str) -> None:
+    # scrapers should never see a half-written file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temporary_path, path)
+
+
+# the Metrics being collected and the methods that were replaced, while enabled
+_active: Metrics | None = None
+_originals: dict[tuple[type, str], Callable] = {}
+
+
+def _timed(metrics: Metrics, name: str, method: Callable) -> Callable:
+    method_name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (id(self), method_name)
+        if key in metrics._running:
+            # a subclass's wrapper is already counting this call (super().give() etc.)
+            return method(self, *args, **kwargs)
+
+        metrics._running.add(key)
+        touched = metrics._touched
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.seconds[name] = metrics.seconds.get(name, 0.0) + time.perf_counter() - start
+            metrics.calls[name] = metrics.calls.get(name, 0) + 1
+            metrics.stacks_touched[name] = metrics.stacks_touched.get(name, 0) + metrics._touched - touched
+            metrics._running.discard(key)
+    return wrapper
+
+
+def _touching(metrics: Metrics, name: str, method: Callable) -> Callable:
+    # these are called a lot, so they're only counted, not timed
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        metrics._touched += 1
+        metrics.calls[name] = metrics.calls.get(name, 0) + 1
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def enable(metrics: Metrics | None=None) -> Metrics:
+    """Start collecting metrics (into a new Metrics unless one is given) and return them."""
+    global _active
+    if _active is not None:
+        disable()
+    if metrics is None:
+        metrics = Metrics()
+
+    for cls, names in INSTRUMENTED.items():
+        for name in names:
+            method = cls.__dict__[name]
+            _originals[(cls, name)] = method
+            setattr(cls, name, _timed(metrics, f"{cls.__name__}.{name}", method))
+
+    for name in TOUCHES:
+        method = ItemStack.__dict__[name]
+        _originals[(ItemStack, name)] = method
+        setattr(ItemStack, name, _touching(metrics, f"ItemStack.{name}", method))
+
+    _active = metrics
+    return metrics
+
+
+def disable() -> Metrics | None:
+    """Stop collecting and put the original methods back; returns what was collected."""
+    global _active
+    for (cls, name), method in _originals.items():
+        setattr(cls, name, method)
+    _originals.clear()
+
+    metrics, _active = _active, None
+    return metrics
+
+
+def active() -> Metrics | None:
+    """Return the Metrics being collected, if enabled."""
+    return _active
+
+
+@contextmanager
+def enabled(metrics: Metrics | None=None) -> Iterator[Metrics]:
+    """Collect metrics for the duration of a with block."""
+    metrics = enable(metrics)
+    try:
+        yield metrics
+    finally:
+        disable()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Text rendering for lists and inventories
+
+Rows are streamed into a Buffer and written out in one go when it's flushed,
+instead of gluing a string together row by row and printing each list
+separately. Lists can be windowed with start/stop (see page_window()), so
+only the visible page of a huge container gets rendered.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from collections.abc import Sequence
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+import math
+
+
+# rows per page in the UI
+PAGE_SIZE = 50
+
+
+class Buffer(object):
+    """Collects lines of text and writes them out with a single call.
+
+    Use as a context manager to flush when the block ends:
+
+        with Buffer(print) as buffer:
+            buffer.line("Header")
+            buffer.lines(rows)
+    """
+    # gets the whole text on flush(); print by default
+    write: Callable[[str], object]
+
+
+    def __init__(self, write: Callable[[str], object]=print) -> Buffer:
+        self.write = write
+        self._lines: list[str] = []
+
+
+    def __enter__(self) -> Buffer:
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+
+
+    def __len__(self) -> int:
+        """Return how many lines are waiting to be written."""
+        return len(self._lines)
+
+
+    def line(self, text: str="") -> None:
+        self._lines.append(text)
+
+
+    def lines(self, texts: Iterable[str], empty: str | None=None) -> None:
+        """Add several lines; if there are none, add empty instead (if given)."""
+        count = len(self._lines)
+        self._lines.extend(texts)
+        if empty is not None and len(self._lines) == count:
+            self._lines.append(empty)
+
+
+    def getvalue(self) -> str:
+        return "\n".join(self._lines)
+
+
+    def flush(self) -> None:
+        """Write out everything collected so far as one string."""
+        if len(self._lines) > 0:
+            self.write(self.getvalue())
+            self._lines.clear()
+
+
+def window(values: Iterable, start: int=0, stop: int | None=None) -> Iterable:
+    """Return values[start:stop], slicing sequences and skipping through anything else."""
+    if isinstance(values, Sequence):
+        if start == 0 and stop is None:
+            return values
+        return values[start:stop]
+    return islice(values, start, stop)
+
+
+def list_rows(values: Iterable, offset: int=0, _filter: Callable | None=None,
+              processor: Callable | None=None, template: str="  {}: {}",
+              start: int=0, stop: int | None=None) -> Iterator[str]:
+    """Format values[start:stop] as numbered rows.
+
+    Numbers count every value (offset + index), including the ones _filter
+    leaves out.
+    """
+    for i, value in enumerate(window(values, start, stop), start + offset):
+        if _filter is not None and not _filter(value):
+            continue
+        if processor is not None:
+            value = processor(value)
+        yield template.format(i, value)
+
+
+def page_count(row_count: int, page_size: int=PAGE_SIZE) -> int:
+    """Return how many pages row_count rows take up (at least 1)."""
+    return max(1, math.ceil(row_count / page_size))
+
+
+def page_window(page: int, page_size: int=PAGE_SIZE) -> tuple[int, int]:
+    """Return the (start, stop) of a page (counting from 0)."""
+    return page * page_size, (page + 1) * page_size
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Replay recorded player sessions against the inventory system, headless
+
+A session is everything one player typed into an InventoryInterface. Session
+files are JSON lines, one session per line:
+
+    {"inventory": "<UUID or name>", "input": ["1", "3", "0"]}
+
+Sessions are replayed as fast as possible with the output thrown away, and
+the time every command (action) takes is reported as percentiles. Record
+sessions with record_session(), or make up random ones with
+generate_sessions().
+
+Usage:
+    python -m scripts.replay SESSIONS --snapshot WORLD.bnbs
+    python -m scripts.replay --generate 1000 --snapshot WORLD.bnbs
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from typing import Callable, Iterable, NamedTuple
+from uuid import UUID
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+try:
+    from .inventory import InventoryHandler, InventoryInterface
+    from .get_input import lines, recording
+    from . import snapshot
+except ImportError:
+    from inventory import InventoryHandler, InventoryInterface
+    from get_input import lines, recording
+    import snapshot
+
+
+class Session(NamedTuple):
+    # UUID (as a string) or name of the inventory the session was in
+    inventory: str
+    # every line the player typed, in order
+    input: list[str]
+
+
+def load_sessions(path: str | os.PathLike) -> list[Session]:
+    sessions = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                data = json.loads(line)
+                sessions.append(Session(data["inventory"], data["input"]))
+    return sessions
+
+
+def save_sessions(path: str | os.PathLike, sessions: Iterable[Session], append: bool=False) -> None:
+    with open(path, "a" if append else "w", encoding="utf-8") as file:
+        for session in sessions:
+            file.write(json.dumps(session._asdict()) + "\n")
+
+
+def record_session(handler: InventoryHandler, inventory_id: UUID,
+                   read: Callable[[str], str] | None=None) -> Session:
+    """Run an interactive session (see InventoryInterface.run()) and return what was typed."""
+    typed = []
+    InventoryInterface(handler, inventory_id, read=recording(read, typed)).run()
+    return Session(str(inventory_id), typed)
+
+
+def generate_sessions(handler: InventoryHandler, count: int, length: int=20, seed: int=0) -> list[Session]:
+    """Make up count sessions of random (valid and invalid) input, each ending with "Back"."""
+    rng = random.Random(seed)
+    inventory_ids = handler.list_ids()
+    # every action but "Back"; the interface has the same actions for every inventory
+    action_count = len(InventoryInterface(handler, inventory_ids[0]).actions)
+
+    sessions = []
+    for _ in range(count):
+        typed = [str(rng.randrange(1, action_count)) for _ in range(length)]
+        # the odd typo
+        if rng.random() < 0.1:
+            typed.insert(rng.randrange(len(typed)), "oops")
+        typed.append("0")
+        sessions.append(Session(str(rng.choice(inventory_ids)), typed))
+    return sessions
+
+
+def _resolve(names: dict[str, UUID], reference: str) -> UUID:
+    try:
+        return UUID(reference)
+    except ValueError:
+        return names[reference]
+
+
+def replay(handler: InventoryHandler, sessions: Iterable[Session]) -> dict[str, list[float]]:
+    """Replay sessions and return how long each command took (in seconds), by action name.
+
+    Only carrying out the actions is timed, not parsing the input.
+    """
+    names = {inventory.name: reference_id for reference_id, inventory in handler.inventories.items()}
+    timings = {}
+    discard = lambda text: None
+
+    for session in sessions:
+        inventory_id = _resolve(names, session.inventory)
+        interface = InventoryInterface(handler, inventory_id, output=discard, read=lines(session.input))
+        action_names = {action: name for name, action in interface.actions}
+
+        while True:
+            try:
+                action = interface.get_user_action()
+            except EOFError:
+                break
+            if action is NotImplemented:
+                break
+
+            start = time.perf_counter()
+            action()
+            elapsed = time.perf_counter() - start
+            timings.setdefault(action_names[action], []).append(elapsed)
+
+    return timings
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    index = max(0, math.ceil(percent / 100 * len(samples)) - 1)
+    return samples[index]
+
+
+def report(timings: dict[str, list[float]], percents: tuple[float, ...]=(50, 90, 99)) -> str:
+    header = f"{'command':<20} {'count':>8}" + "".join(f" {f'p{p:g}':>10}" for p in percents) + f" {'max':>10}"
+    rows = [header]
+    everything = []
+    for name, samples in sorted(timings.items()):
+        samples.sort()
+        everything.extend(samples)
+        rows.append(_report_row(name, samples, percents))
+
+    everything.sort()
+    if len(everything) > 0:
+        rows.append(_report_row("(all)", everything, percents))
+    rows.append("(times in ms)")
+    return "\n".join(rows)
+
+
+def _report_row(name: str, samples: list[float], percents: tuple[float, ...]) -> str:
+    return (f"{name:<20} {len(samples):>8}" + "".join(f" {percentile(samples, p) * 1000:10.3f}" for p in percents)
+            + f" {samples[-1] * 1000:10.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sessions", nargs="?", help="JSON lines file of recorded sessions")
+    parser.add_argument("--snapshot", required=True, help="world to replay the sessions in")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="replay N random sessions instead (and save them to SESSIONS, if given)")
+    args = parser.parse_args()
+
+    handler = snapshot.load(args.snapshot)
+    if args.generate is not None:
+        sessions = generate_sessions(handler, args.generate)
+        if args.sessions is not None:
+            save_sessions(args.sessions, sessions)
+    elif args.sessions is not None:
+        sessions = load_sessions(args.sessions)
+    else:
+        parser.error("either SESSIONS or --generate is needed")
+
+    start = time.perf_counter()
+    timings = replay(handler, sessions)
+    elapsed = time.perf_counter() - start
+
+    commands = sum(len(samples) for samples in timings.values())
+    print(f"Replayed {len(sessions)} sessions ({commands} commands) in {elapsed:.2f} s")
+    print(report(timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""Run a world's inventories in several worker processes (shards)
+
+For simulations with a lot of trades between NPCs: one process can only do
+one transfer at a time, so a ShardedWorld splits the inventories of an
+InventoryHandler between worker processes by UUID (uuid.int % shard count)
+and lets every worker do the trades of its own inventories.
+
+    with ShardedWorld(handler, 4) as world:
+        moved = world.trade([(source_id, target_id, apple, 3), ...])
+        handler = world.collect()
+
+Inventories inside containers live on the same shard as the outermost
+inventory holding them, so every container tree is in one process. The
+workers get their inventories as a snapshot (see snapshot.py) and hand
+them back the same way in collect(); trades are sent as plain tuples, with
+Items pickled by their definition.
+
+A trade between two inventories on the same shard is an ordinary
+transfer() in that worker. A trade between shards takes two steps: the
+source shard takes the Items, then the target shard gives them; whatever
+didn't fit goes back to the source. To make sure it always fits back in,
+trades are grouped into rounds in which no inventory both sends and
+receives Items from another shard. All shards work on a round at the same
+time.
+
+Trades are only applied in the order they were given within a shard, not
+across shards: each round does all trades that stay on a shard first. Only
+plain Items can be traded, not containers.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from typing import Iterable
+from uuid import UUID
+import multiprocessing
+import os
+
+try:
+    from .inventory import InventoryHandler, InventoryNotFoundError, ContainerError, Item, ContainerItem
+    from . import snapshot
+except ImportError:
+    from inventory import InventoryHandler, InventoryNotFoundError, ContainerError, Item, ContainerItem
+    import snapshot
+
+
+class ShardedWorld(object):
+    """The inventories of an InventoryHandler, split between worker processes.
+
+    The handler is only read when the world is created; get the result back
+    with collect(). Close the world (or use it as a context manager) to stop
+    the workers.
+    """
+    shard_count: int
+    # inventory UUID -> index of the shard it's on
+    shards: dict[UUID, int]
+
+
+    def __init__(self, handler: InventoryHandler, shard_count: int | None=None,
+                 start_method: str | None=None) -> ShardedWorld:
+        if shard_count is None:
+            shard_count = os.cpu_count() or 1
+        if shard_count < 1:
+            raise ValueError(f"A ShardedWorld needs at least one shard, not {shard_count}")
+
+        self.shard_count = shard_count
+        self.shards = {}
+        partitions = [{} for _ in range(shard_count)]
+        for reference_id, inventory in handler.inventories.items():
+            # containers go wherever the outermost inventory holding them goes
+            ancestors = handler.ancestors(reference_id)
+            root_id = ancestors[-1] if len(ancestors) > 0 else reference_id
+            shard = root_id.int % shard_count
+            self.shards[reference_id] = shard
+            partitions[shard][reference_id] = inventory
+
+        context = multiprocessing.get_context(start_method)
+        self._connections = []
+        self._processes = []
+        for partition in partitions:
+            # snapshot.py only looks at the inventories
+            data = snapshot.dumps(InventoryHandler(partition, {}))
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_serve, args=(worker_connection, data), daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+
+    def __repr__(self) -> str:
+        return f"ShardedWorld({len(self.shards)} inventories on {self.shard_count} shards)"
+
+
+    def __enter__(self) -> ShardedWorld:
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+    def close(self) -> None:
+        """Stop the workers; the world can't be used afterwards."""
+        for connection in self._connections:
+            try:
+                connection.send(("stop", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+        self._processes.clear()
+
+
+    def shard_of(self, reference_id: UUID) -> int:
+        """Return the index of the shard an inventory is on."""
+        try:
+            return self.shards[reference_id]
+        except KeyError:
+            raise InventoryNotFoundError(f"Could not find inventory with UUID {reference_id}") from None
+
+
+    def _call(self, messages: dict[int, tuple[str, object]]) -> dict[int, object]:
+        """Send a (command, payload) to each of the given shards and wait for all of them.
+
+        Every answer is read before raising a worker's exception, so the
+        pipes stay in step.
+        """
+        for shard, message in messages.items():
+            self._connections[shard].send(message)
+
+        results = {}
+        error = None
+        for shard in messages:
+            ok, result = self._connections[shard].recv()
+            if ok:
+                results[shard] = result
+            elif error is None:
+                error = result
+
+        if error is not None:
+            raise error
+        return results
+
+
+    def trade(self, trades: Iterable[tuple[UUID, UUID, Item, int]]) -> list[int]:
+        """Carry out a batch of (source UUID, target UUID, Item, count) transfers.
+
+        Each one moves as many as there are and fit, like transfer() does.
+        Returns how many were moved by each trade.
+        """
+        trades = list(trades)
+        moved = [0] * len(trades)
+        # shard -> [(trade index, trade)]; these are done in one go at the start
+        local = {}
+        # trades between shards, grouped into rounds
+        rounds = []
+        # per round: inventories that send / receive
+        senders = []
+        receivers = []
+
+        for index, (source_id, target_id, item, count) in enumerate(trades):
+            if isinstance(item, ContainerItem):
+                raise ContainerError(f"Containers can't be traded in a ShardedWorld ('{item.name}')")
+            source_shard = self.shard_of(source_id)
+            target_shard = self.shard_of(target_id)
+
+            if source_shard == target_shard:
+                local.setdefault(source_shard, []).append((index, (source_id.int, target_id.int, item, count)))
+                continue
+
+            # first round where the source doesn't receive and the target doesn't send anything
+            for round_index in range(len(rounds) + 1):
+                if round_index == len(rounds):
+                    rounds.append([])
+                    senders.append(set())
+                    receivers.append(set())
+                if source_id not in receivers[round_index] and target_id not in senders[round_index]:
+                    break
+            rounds[round_index].append((index, source_shard, target_shard, source_id.int, target_id.int, item, count))
+            senders[round_index].add(source_id)
+            receivers[round_index].add(target_id)
+
+        if len(rounds) == 0:
+            rounds.append([])
+        # Items that have to go back to their source, from the previous round
+        returns = {}
+
+        for round_index, crossing in enumerate(rounds):
+            # step 1: trades within shards (first round only), take what goes to other shards
+            takes = {}
+            for trade in crossing:
+                takes.setdefault(trade[1], []).append(trade)
+            shards = set(takes) | set(returns)
+            if round_index == 0:
+                shards |= set(local)
+
+            messages = {}
+            for shard in shards:
+                messages[shard] = ("batch", ([give for _, give in returns.get(shard, ())],
+                                             [trade for _, trade in local.get(shard, ())] if round_index == 0 else [],
+                                             [(source, item, count) for _, _, _, source, _, item, count in
+                                              takes.get(shard, ())]))
+            results = self._call(messages)
+
+            for shard, (leftovers, local_moved, taken) in results.items():
+                for (index, give), leftover in zip(returns.get(shard, ()), leftovers):
+                    # it came out of there this round, so it has to fit
+                    assert leftover == 0, f"{leftover}x {give[1]} didn't fit back into its inventory"
+                    moved[index] -= give[2]
+                if round_index == 0:
+                    for (index, _), count in zip(local.get(shard, ()), local_moved):
+                        moved[index] = count
+                for trade, count in zip(takes.get(shard, ()), taken):
+                    moved[trade[0]] = count
+
+            # step 2: give the Items to the target shards
+            gives = {}
+            for index, _, target_shard, _, target, item, _ in crossing:
+                if moved[index] > 0:
+                    gives.setdefault(target_shard, []).append((index, (target, item, moved[index])))
+            results = self._call({shard: ("batch", ([give for _, give in shard_gives], [], []))
+                                  for shard, shard_gives in gives.items()})
+
+            # whatever didn't fit goes back (at the start of the next round)
+            sources = {trade[0]: trade for trade in crossing}
+            returns = {}
+            for shard, (leftovers, _, _) in results.items():
+                for (index, (_, item, _)), leftover in zip(gives[shard], leftovers):
+                    if leftover > 0:
+                        _, source_shard, _, source, _, _, _ = sources[index]
+                        returns.setdefault(source_shard, []).append((index, (source, item, leftover)))
+
+        if len(returns) > 0:
+            results = self._call({shard: ("batch", ([give for _, give in shard_returns], [], []))
+                                  for shard, shard_returns in returns.items()})
+            for shard, (leftovers, _, _) in results.items():
+                for (index, give), leftover in zip(returns[shard], leftovers):
+                    assert leftover == 0, f"{leftover}x {give[1]} didn't fit back into its inventory"
+                    moved[index] -= give[2]
+
+        return moved
+
+
+    def transfer(self, source_id: UUID, target_id: UUID, item: Item, count: int=1) -> int:
+        """Move Items from one inventory to another; returns how many were moved.
+
+        Use trade() for anything more than the odd transfer; every call is a
+        round trip to the workers.
+        """
+        return self.trade([(source_id, target_id, item, count)])[0]
+
+
+    def amount(self, reference_id: UUID, item: Item) -> int:
+        """Return how many of an Item are in an inventory."""
+        shard = self.shard_of(reference_id)
+        return self._call({shard: ("amount", (reference_id.int, item))})[shard]
+
+
+    def total(self, item: Item) -> int:
+        """Return how many of an Item there are across all shards."""
+        return sum(self._call({shard: ("total", item) for shard in range(self.shard_count)}).values())
+
+
+    def collect(self) -> InventoryHandler:
+        """Return a new InventoryHandler with the current state of every shard."""
+        handler = InventoryHandler._init()
+        for data in self._call({shard: ("dump", None) for shard in range(self.shard_count)}).values():
+            snapshot.loads(data, handler=handler)
+        return handler
+
+
+def _serve(connection: multiprocessing.connection.Connection, data: bytes) -> None:
+    """Main loop of a worker: load the shard, then answer commands until told to stop."""
+    handler = snapshot.loads(data)
+    # UUIDs are sent as ints; they're cheaper to pickle
+    inventories = {reference_id.int: inventory for reference_id, inventory in handler.inventories.items()}
+
+    while True:
+        try:
+            command, payload = connection.recv()
+        except EOFError:
+            # the world went away without closing
+            break
+        if command == "stop":
+            break
+
+        try:
+            if command == "batch":
+                gives, trades, takes = payload
+                result = ([inventories[target].give(item, count) for target, item, count in gives],
+                          [_transfer(inventories, *trade) for trade in trades],
+                          [inventories[source].take(item, count) for source, item, count in takes])
+            elif command == "amount":
+                reference_id, item = payload
+                result = inventories[reference_id].amount(item)
+            elif command == "total":
+                result = handler.total(payload)
+            elif command == "dump":
+                result = snapshot.dumps(handler)
+            else:
+                raise ValueError(f"Unknown command {command!r}")
+        except Exception as e:
+            connection.send((False, e))
+        else:
+            connection.send((True, result))
+
+    connection.close()
+
+
+def _transfer(inventories: dict, source_id: int, target_id: int, item: Item, count: int) -> int:
+    """transfer() within a worker; returns how many were moved."""
+    source = inventories[source_id]
+    before = source.amount(item)
+    source.transfer(inventories[target_id], item, count)
+    return before - source.amount(item)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""Binary save files (snapshots) for an InventoryHandler
+
+A snapshot holds every registered inventory (with its UUID) and every Item
+they contain. Items are written once and referred to by index, and
+ContainerItems keep pointing at their inventories.
+
+Layout (little-endian):
+    header       magic, version, item count, inventory count, generation
+    items        kind, name length, stack size, base mass, volume, name
+                 (+ 16 byte inventory UUID for containers)
+    inventories  UUID, kind, name length, slot count, entry count, name,
+                 (+ max mass and max volume for a LimitedInventory),
+                 then the entries as three arrays: slot index (uint32),
+                 item index (uint32), count (int64)
+
+The generation is an id the journal written on top of the snapshot repeats
+in its own header (see journal.py).
+
+Inventories are written so that a container's inventory always comes before
+the inventory holding the container, which lets load() fill each one with
+the final mass of its containers.
+
+Created on 2026.10.18
+"""
+
+
+from __future__ import annotations
+from array import array
+from typing import BinaryIO, Callable, TYPE_CHECKING
+from uuid import UUID
+import io
+import mmap
+import os
+import struct
+import sys
+
+try:
+    from .inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, Item, ContainerItem
+except ImportError:
+    from inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, Item, ContainerItem
+
+if TYPE_CHECKING:
+    from .journal import Journal
+
+
+MAGIC = b"BNBS"
+VERSION = 1
+
+# magic, version, item count, inventory count, generation
+_HEADER = struct.Struct("<4sHIIQ")
+# kind, name length, stack size, base mass, volume
+_ITEM = struct.Struct("<BHIdd")
+# UUID, kind, name length, slot count, entry count
+_INVENTORY = struct.Struct("<16sBHII")
+# max mass, max volume of a LimitedInventory
+_LIMITS = struct.Struct("<dd")
+
+# item kinds
+ITEM = 0
+CONTAINER = 1
+# inventory kinds
+INVENTORY = 0
+SLOT_INVENTORY = 1
+LIMITED_INVENTORY = 2
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot can't be read."""
+    pass
+
+
+def save(handler: InventoryHandler, file: str | os.PathLike | BinaryIO, generation: int=0) -> None:
+    """Write a snapshot of handler to a path or a binary file object."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "wb") as f:
+            _write(handler, f, generation)
+    else:
+        _write(handler, file, generation)
+
+
+def dumps(handler: InventoryHandler) -> bytes:
+    """Return a snapshot of handler as bytes."""
+    buffer = io.BytesIO()
+    _write(handler, buffer)
+    return buffer.getvalue()
+
+
+def load(path: str | os.PathLike, columnar: bool=False, journal: Journal | None=None,
+         concurrent: bool=False, events: bool=False) -> InventoryHandler:
+    """Read a snapshot file into a new InventoryHandler.
+
+    The file is memory-mapped instead of being read in one go. columnar,
+    journal, concurrent and events are passed on to InventoryHandler._init().
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise SnapshotError(f"{path} is empty")
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return _read(view, columnar, journal, concurrent, events)
+            finally:
+                view.release()
+
+
+def read_generation(path: str | os.PathLike) -> int:
+    """Return the generation of a snapshot file without loading it."""
+    with open(path, "rb") as file:
+        data = file.read(_HEADER.size)
+    try:
+        return _read_header(memoryview(data))[4]
+    except struct.error as e:
+        raise SnapshotError(f"Snapshot is corrupted: {e}") from e
+
+
+def _read_header(buffer: memoryview) -> tuple[bytes, int, int, int, int]:
+    """Return magic, version, item count, inventory count and generation."""
+    header = _HEADER.unpack_from(buffer, 0)
+    magic, version = header[:2]
+    if magic != MAGIC:
+        raise SnapshotError("Not a snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+    return header
+
+
+def loads(data: bytes | bytearray | memoryview, columnar: bool=False,
+          journal: Journal | None=None, concurrent: bool=False, events: bool=False,
+          handler: InventoryHandler | None=None) -> InventoryHandler:
+    """Read a snapshot from bytes into a new InventoryHandler.
+
+    If a handler is given, the inventories are added to it instead (and the
+    other arguments are ignored); used to merge several snapshots.
+    """
+    with memoryview(data) as view:
+        return _read(view, columnar, journal, concurrent, events, handler)
+
+
+def _save_order(handler: InventoryHandler) -> list[UUID]:
+    """Return the UUIDs of all inventories, with containers' inventories before
+    the inventories holding them."""
+    children = {}
+    for reference_id, inventory in handler.inventories.items():
+        children[reference_id] = [item.inventory_id for item in inventory.counts()
+                                  if isinstance(item, ContainerItem) and item.inventory_id in handler.inventories]
+
+    order = []
+    visited = set()
+    for reference_id in handler.inventories:
+        # depth-first, adding each inventory after its children
+        stack = [(reference_id, False)]
+        while len(stack) > 0:
+            current, children_done = stack.pop()
+            if children_done:
+                order.append(current)
+                continue
+            if current in visited:
+                continue
+
+            visited.add(current)
+            stack.append((current, True))
+            for child in children[current]:
+                stack.append((child, False))
+
+    return order
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode_item(item: Item) -> bytes:
+    name = item.name.encode("utf-8")
+    if isinstance(item, ContainerItem):
+        return (_ITEM.pack(CONTAINER, len(name), item.stack_size, item.base_mass, item.volume) + name
+                + item.inventory_id.bytes)
+    else:
+        return _ITEM.pack(ITEM, len(name), item.stack_size, item.base_mass, item.volume) + name
+
+
+def _encode_inventory(reference_id: UUID, inventory: Inventory | SlotInventory,
+                      item_index: Callable[[Item], int]) -> bytes:
+    """Encode an inventory and its contents, using item_index to look up Item indices."""
+    slots = array("I")
+    item_indices = array("I")
+    counts = array("q")
+    limits = b""
+
+    if isinstance(inventory, SlotInventory):
+        kind = SLOT_INVENTORY
+        slot_count = inventory.slot_count
+        for index, slot in enumerate(inventory.slots):
+            if slot is not None:
+                slots.append(index)
+                item_indices.append(item_index(slot.item))
+                counts.append(slot.count)
+    else:
+        if isinstance(inventory, LimitedInventory):
+            kind = LIMITED_INVENTORY
+            limits = _LIMITS.pack(inventory.max_mass, inventory.max_volume)
+        else:
+            kind = INVENTORY
+        slot_count = 0
+        for item, count in inventory.counts().items():
+            slots.append(0)
+            item_indices.append(item_index(item))
+            counts.append(count)
+
+    name = inventory.name.encode("utf-8")
+    return b"".join((_INVENTORY.pack(reference_id.bytes, kind, len(name), slot_count, len(counts)), name, limits,
+                     _to_bytes(slots), _to_bytes(item_indices), _to_bytes(counts)))
+
+
+def _write(handler: InventoryHandler, file: BinaryIO, generation: int=0) -> None:
+    order = _save_order(handler)
+
+    # Item -> index, in order of first appearance
+    items = {}
+    for reference_id in order:
+        for item in handler.inventories[reference_id].counts():
+            if item not in items:
+                items[item] = len(items)
+
+    file.write(_HEADER.pack(MAGIC, VERSION, len(items), len(order), generation))
+
+    for item in items:
+        file.write(_encode_item(item))
+
+    for reference_id in order:
+        file.write(_encode_inventory(reference_id, handler.inventories[reference_id], items.__getitem__))
+
+
+def _read_array(typecode: str, buffer: memoryview, offset: int, length: int) -> tuple[array, int]:
+    """Read length values starting at offset; returns the array and the new offset."""
+    values = array(typecode)
+    end = offset + length * values.itemsize
+    if end > len(buffer):
+        raise SnapshotError("Snapshot is truncated")
+
+    values.frombytes(buffer[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def _read(buffer: memoryview, columnar: bool, journal: Journal | None, concurrent: bool, events: bool,
+          handler: InventoryHandler | None=None) -> InventoryHandler:
+    try:
+        _, _, item_count, inventory_count, _ = _read_header(buffer)
+        offset = _HEADER.size
+
+        if handler is None:
+            handler = InventoryHandler._init(columnar=columnar, journal=journal, concurrent=concurrent,
+                                             events=events)
+
+        items = []
+        for _ in range(item_count):
+            item, offset = _read_item(buffer, offset, handler)
+            items.append(item)
+
+        for _ in range(inventory_count):
+            reference_id, inventory, offset = _read_inventory(buffer, offset, items)
+            handler.add(inventory, reference_id)
+
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Snapshot is corrupted: {e}") from e
+
+    return handler
+
+
+def _read_item(buffer: memoryview, offset: int, handler: InventoryHandler) -> tuple[Item, int]:
+    """Read an Item starting at offset; returns the Item and the new offset."""
+    kind, name_length, stack_size, base_mass, volume = _ITEM.unpack_from(buffer, offset)
+    offset += _ITEM.size
+    name = str(buffer[offset:offset + name_length], "utf-8")
+    offset += name_length
+
+    if kind == CONTAINER:
+        if offset + 16 > len(buffer):
+            raise SnapshotError("Snapshot is truncated")
+        inventory_id = UUID(bytes=bytes(buffer[offset:offset + 16]))
+        return ContainerItem(name, base_mass, inventory_id, handler, volume), offset + 16
+    else:
+        return Item(name, stack_size, base_mass, volume), offset
+
+
+def _read_inventory(buffer: memoryview, offset: int,
+                    items: list[Item]) -> tuple[UUID, Inventory | SlotInventory, int]:
+    """Read an inventory starting at offset; returns its UUID, the (unregistered)
+    inventory and the new offset."""
+    raw_id, kind, name_length, slot_count, entry_count = _INVENTORY.unpack_from(buffer, offset)
+    offset += _INVENTORY.size
+    name = str(buffer[offset:offset + name_length], "utf-8")
+    offset += name_length
+    if kind == LIMITED_INVENTORY:
+        max_mass, max_volume = _LIMITS.unpack_from(buffer, offset)
+        offset += _LIMITS.size
+
+    slots, offset = _read_array("I", buffer, offset, entry_count)
+    item_indices, offset = _read_array("I", buffer, offset, entry_count)
+    counts, offset = _read_array("q", buffer, offset, entry_count)
+    entry_items = [items[i] for i in item_indices]
+
+    if kind == SLOT_INVENTORY:
+        inventory = SlotInventory(name, slot_count)
+        inventory._load(zip(slots, entry_items, counts))
+    elif kind == LIMITED_INVENTORY:
+        inventory = LimitedInventory(name, max_mass, max_volume)
+        inventory._load(zip(entry_items, counts))
+    else:
+        inventory = Inventory(name)
+        inventory._load(zip(entry_items, counts))
+
+    return UUID(bytes=raw_id), inventory, offset
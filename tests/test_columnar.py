@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Tests for the columnar store (columnar.py); skipped without NumPy
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item
+
+
+APPLE = Item("Test apple", 10, 0.25)
+SWORD = Item("Test sword", 1, 3.0)
+
+
+def test_queries_match_inventories():
+    handler = InventoryHandler._init(columnar=True)
+    chest_id = handler.add(SlotInventory("Chest", 4))
+    player_id = handler.add(Inventory("Player"))
+    handler.give(chest_id, APPLE, 25)
+    handler.give(player_id, APPLE, 3)
+    handler.give(player_id, SWORD)
+    handler.take(chest_id, APPLE, 5)
+
+    store = handler.store
+    assert store.total(APPLE) == handler.total(APPLE) == 23
+    assert store.totals() == {APPLE: 23, SWORD: 1}
+    assert store.holders(APPLE) == handler.locate(APPLE)
+    assert store.heavier_than(4.0) == [chest_id]
+
+
+def test_masses_include_container_contents():
+    handler = InventoryHandler._init(columnar=True)
+    player_id = handler.add(Inventory("Player"))
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+    handler.give(player_id, bag)
+    # filled after it was put away, so the player's row for the bag doesn't change
+    handler.give(bag.inventory_id, SWORD, 2)
+
+    masses = dict(zip(handler.store.inventory_ids, handler.store.masses()))
+    assert masses[player_id] == pytest.approx(handler.get(player_id).mass) == pytest.approx(7.0)
+    assert masses[bag.inventory_id] == pytest.approx(6.0)
+    assert handler.store.heavier_than(6.5) == [player_id]
+
+
+def test_bulk_update_goes_through_inventories():
+    handler = InventoryHandler._init(columnar=True)
+    chest_id = handler.add(SlotInventory("Chest", 4))
+    handler.give(chest_id, APPLE, 30)
+
+    assert handler.bulk_update([APPLE], lambda counts: counts // 2) == 1
+    assert handler.get(chest_id).amount(APPLE) == 15
+    assert handler.store.total(APPLE) == 15
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Tests for SlotInventory.compact() and sort()
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import SlotInventory, Item
+
+
+APPLE = Item("Test apple", 10, 0.25)
+BREAD = Item("Test bread", 5, 0.5)
+SWORD = Item("Test sword", 1, 3.0)
+
+
+def layout(inventory: SlotInventory) -> list:
+    return [None if slot is None else (slot.item.name, slot.count) for slot in inventory.slots]
+
+
+def fragmented() -> SlotInventory:
+    """Return a SlotInventory with holes and several partial stacks of the same Items."""
+    inventory = SlotInventory("Chest", 8)
+    inventory._load([(0, APPLE, 4), (1, SWORD, 1), (3, APPLE, 6), (4, BREAD, 2), (5, APPLE, 9), (7, BREAD, 5)])
+    return inventory
+
+
+def test_compact_merges_stacks():
+    inventory = fragmented()
+    totals = dict(inventory.counts())
+    mass = inventory.mass
+    assert inventory.fragmentation > 0
+
+    inventory.compact()
+    # Items keep the order they first appear in
+    assert layout(inventory) == [("Test apple", 10), ("Test apple", 9), ("Test sword", 1), ("Test bread", 5),
+                                 ("Test bread", 2), None, None, None]
+    assert dict(inventory.counts()) == totals
+    assert inventory.mass == pytest.approx(mass)
+    assert inventory.fragmentation == 0
+    assert inventory.free_slots == 3
+
+    # the lookup tables were rebuilt too
+    assert inventory.give(APPLE, 1) == 0
+    assert layout(inventory)[1] == ("Test apple", 10)
+    assert inventory.give(SWORD, 1) == 0
+    assert layout(inventory)[5] == ("Test sword", 1)
+    assert inventory.take(BREAD, 7) == 7
+    assert layout(inventory)[3:5] == [None, None]
+
+
+def test_sort_orders_items():
+    inventory = fragmented()
+    totals = dict(inventory.counts())
+
+    inventory.sort()
+    assert [slot.item.name for slot in inventory.slots if slot is not None] == ["Test apple"] * 2 + ["Test bread"] * 2 + ["Test sword"]
+    inventory.sort(key=lambda item: item.base_mass, reverse=True)
+    assert [slot.item.name for slot in inventory.slots if slot is not None] == ["Test sword"] + ["Test bread"] * 2 + ["Test apple"] * 2
+    assert dict(inventory.counts()) == totals
+
+    with pytest.raises(ValueError):
+        inventory._arrange([APPLE, BREAD])
+
+
+def test_auto_compact():
+    inventory = fragmented()
+    # the apples take up one slot more than they need, one in 8 slots
+    assert inventory.fragmentation == 0.125
+    inventory.auto_compact = 0.2
+    inventory.give(SWORD, 1)
+    assert inventory.fragmentation == 0.125
+
+    inventory.auto_compact = 0.1
+    # the next change notices
+    inventory.give(SWORD, 1)
+    assert inventory.fragmentation == 0
+    assert dict(inventory.counts()) == {APPLE: 19, SWORD: 3, BREAD: 7}
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests for concurrent mode: many threads moving Items around at once
+
+Uses the same workload as benchmarks/stress.py, only smaller.
+
+Created on 2026.10.18
+"""
+
+
+import random
+import sys
+import threading
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item, TransactionError
+from scripts import journal
+from benchmarks import stress
+
+
+@pytest.fixture
+def switch_often():
+    # switch threads as often as possible, so races actually happen
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(handler, items, bags, thread_count: int=8, operations: int=1500) -> None:
+    threads = [threading.Thread(target=stress.worker, args=(handler, items, bags, operations, seed))
+               for seed in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_threads_conserve_items(switch_often):
+    handler, items, bags = stress.build_world(30)
+    expected = stress.totals(handler)
+
+    run_threads(handler, items, bags)
+
+    assert stress.check(handler, expected, bags) == []
+
+
+def test_failed_transaction_changes_nothing_concurrent():
+    x, y, z = Item("Test X", 10, 1.0), Item("Test Y", 10, 1.0), Item("Test Z", 64, 1.0)
+    handler = InventoryHandler._init(concurrent=True)
+    chest = SlotInventory("Chest", 2)
+    chest.give(y, 10)
+    chest.give(x, 9)
+    chest_id = handler.add(chest)
+
+    with pytest.raises(TransactionError):
+        with handler.transaction() as tx:
+            tx.take(chest_id, y, 10)
+            tx.give(chest_id, x, 3)
+            tx.give(chest_id, z, 50)
+
+    assert [(slot.item, slot.count) for slot in chest.slots] == [(y, 10), (x, 9)]
+    assert handler.locate(y) == {chest_id: 10}
+
+
+def test_journal_of_concurrent_changes_recovers(tmp_path, switch_often):
+    snapshot_path, journal_path = str(tmp_path / "world.bnbs"), str(tmp_path / "world.bnbj")
+    handler = journal.recover(snapshot_path, journal_path, concurrent=True)
+
+    rng = random.Random(0)
+    items = [Item(f"Test item {i}", rng.choice((1, 8, 16)), rng.random()) for i in range(10)]
+    ids = []
+    for i in range(20):
+        inventory = Inventory(f"Chest {i}") if i % 3 == 0 else SlotInventory(f"Box {i}", 30)
+        for _ in range(5):
+            inventory.give(rng.choice(items), rng.randint(1, 20))
+        ids.append(handler.add(inventory))
+    bags = []
+    for i in range(3):
+        bag = handler.add_container(f"Bag {i}", 0.5, SlotInventory(f"Bag {i}", 10))
+        handler.give(ids[3 * i], bag)
+        bags.append(bag)
+
+    run_threads(handler, items, bags, operations=500)
+    handler.journal.flush(sync=True)
+    handler.journal.close()
+
+    recovered = journal.recover(snapshot_path, journal_path)
+    recovered.journal.close()
+    assert sorted(recovered.inventories) == sorted(handler.inventories)
+    for reference_id, inventory in handler.inventories.items():
+        other = recovered.get(reference_id)
+        assert other.counts() == inventory.counts(), inventory.name
+        if isinstance(inventory, SlotInventory):
+            assert [None if slot is None else (slot.item, slot.count) for slot in other.slots] == \
+                   [None if slot is None else (slot.item, slot.count) for slot in inventory.slots]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests for containers (ContainerItem) and the tree they make
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, Item, ContainerError
+
+
+APPLE = Item("Test apple", 10, 0.25)
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_remove_refuses_placed_container(concurrent):
+    handler = InventoryHandler._init(concurrent=concurrent)
+    player_id = handler.add(Inventory("Player"))
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+    handler.give(bag.inventory_id, APPLE, 4)
+    handler.give(player_id, bag)
+
+    with pytest.raises(ContainerError):
+        handler.remove(bag.inventory_id)
+    # nothing changed
+    assert handler.get(bag.inventory_id).amount(APPLE) == 4
+    assert handler.locate(APPLE) == {bag.inventory_id: 4}
+
+    # taking it out first works
+    handler.take(player_id, bag)
+    handler.remove(bag.inventory_id)
+    assert handler.get(player_id).mass == 0
+    assert handler.locate(APPLE) == {}
+
+
+def test_container_cant_go_inside_itself():
+    handler = InventoryHandler._init()
+    room_id = handler.add(Inventory("Room"))
+    outer = handler.add_container("Outer", 1.0, Inventory("Outer"))
+    inner = handler.add_container("Inner", 1.0, Inventory("Inner"))
+    handler.give(room_id, outer)
+    handler.give(outer.inventory_id, inner)
+
+    with pytest.raises(ContainerError):
+        handler.transfer(room_id, inner.inventory_id, outer)
+    assert handler.get(room_id).amount(outer) == 1
+    assert handler.get(room_id).deep_amount(inner) == 1
+
+
+@pytest.mark.parametrize("make_inventory", [lambda: Inventory("Room"), lambda: SlotInventory("Room", 4),
+                                            lambda: LimitedInventory("Room", max_mass=100.0)])
+def test_max_acceptable_follows_container_rules(make_inventory):
+    handler = InventoryHandler._init()
+    room_id = handler.add(make_inventory())
+    other_id = handler.add(Inventory("Other"))
+    room = handler.get(room_id)
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+
+    assert room.max_acceptable(bag) == 1
+    assert room.has_space_for(bag, 1)
+    assert not room.has_space_for(bag, 2)
+    assert room.fit_plan({bag: 2}).accepted == {bag: 1}
+
+    # already somewhere else
+    handler.give(other_id, bag)
+    assert room.max_acceptable(bag) == 0
+    assert room.max_acceptable(bag, source=handler.get(other_id)) == 1
+    assert room.fit_plan({bag: 1}).accepted == {bag: 0}
+
+    # moving it still works
+    handler.transfer(other_id, room_id, bag)
+    assert room.amount(bag) == 1
+
+    # and it can't take its own container
+    inner = handler.get(bag.inventory_id)
+    room_bag = handler.add_container("Room bag", 1.0, make_inventory())
+    handler.give(bag.inventory_id, room_bag)
+    assert handler.get(room_bag.inventory_id).max_acceptable(bag, source=room) == 0
+    assert inner.max_acceptable(bag) == 0
+
+
+def test_transfer_many_checks_containers():
+    handler = InventoryHandler._init()
+    room_id = handler.add(SlotInventory("Room", 4))
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+    pouch = handler.add_container("Pouch", 0.5, Inventory("Pouch"))
+    handler.give(room_id, bag)
+    handler.give(room_id, APPLE, 3)
+    handler.give(bag.inventory_id, pouch)
+
+    results = handler.transfer_many(room_id, pouch.inventory_id, {APPLE: 3})
+    assert [result.moved for result in results] == [3]
+    with pytest.raises(ContainerError):
+        handler.transfer_many(room_id, pouch.inventory_id, {bag: 1})
+    assert handler.get(room_id).amount(bag) == 1
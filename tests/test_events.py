@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Tests for change events (events.py)
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item
+from scripts.events import (Event, ITEM_ADDED, ITEM_REMOVED, SLOT_CHANGED, INVENTORY_ADDED,
+                            INVENTORY_REMOVED)
+
+
+APPLE = Item("Test apple", 10, 0.25)
+SWORD = Item("Test sword", 1, 3.0)
+
+
+@pytest.fixture
+def handler():
+    return InventoryHandler._init(events=True)
+
+
+def test_changes_coalesce_within_a_tick(handler):
+    player_id = handler.add(Inventory("Player"))
+    handler.flush_events()
+    received = []
+    handler.events.subscribe(received.append)
+
+    handler.give(player_id, APPLE, 5)
+    handler.take(player_id, APPLE, 2)
+    handler.give(player_id, APPLE, 4)
+    # added and taken again: not reported at all
+    handler.give(player_id, SWORD)
+    handler.take(player_id, SWORD)
+
+    assert handler.flush_events() == 1
+    assert received == [[Event(ITEM_ADDED, player_id, APPLE, 7)]]
+
+    # nothing happened since
+    assert handler.flush_events() == 0
+    assert len(received) == 1
+
+    handler.take(player_id, APPLE, 7)
+    handler.flush_events()
+    assert received[-1] == [Event(ITEM_REMOVED, player_id, APPLE, 7)]
+
+
+def test_slot_changes_report_what_is_there_now(handler):
+    chest_id = handler.add(SlotInventory("Chest", 3))
+    handler.flush_events()
+    received = []
+    handler.events.subscribe(received.append, kinds={SLOT_CHANGED})
+
+    handler.give(chest_id, APPLE, 15)
+    handler.take(chest_id, APPLE, 5)
+    handler.flush_events()
+
+    # slot 1 was filled and emptied again, but it was touched
+    assert received == [[Event(SLOT_CHANGED, chest_id, APPLE, 10, 0),
+                         Event(SLOT_CHANGED, chest_id, None, 0, 1)]]
+
+
+def test_item_and_inventory_filters(handler):
+    player_id = handler.add(Inventory("Player"))
+    chest_id = handler.add(SlotInventory("Chest", 3))
+    apples, player, player_swords, lifecycle = [], [], [], []
+    handler.events.subscribe(apples.append, kinds={ITEM_ADDED, ITEM_REMOVED}, items={APPLE})
+    handler.events.subscribe(player.append, inventories={player_id})
+    handler.events.subscribe(player_swords.append, items={SWORD}, inventories={player_id})
+    handler.events.subscribe(lifecycle.append, kinds={INVENTORY_ADDED, INVENTORY_REMOVED})
+
+    handler.give(player_id, APPLE, 2)
+    handler.give(chest_id, APPLE, 3)
+    handler.give(chest_id, SWORD)
+    handler.flush_events()
+
+    assert apples == [[Event(ITEM_ADDED, player_id, APPLE, 2), Event(ITEM_ADDED, chest_id, APPLE, 3)]]
+    assert player == [[Event(INVENTORY_ADDED, player_id), Event(ITEM_ADDED, player_id, APPLE, 2)]]
+    # the sword went into the chest
+    assert player_swords == []
+    assert lifecycle == [[Event(INVENTORY_ADDED, player_id), Event(INVENTORY_ADDED, chest_id)]]
+
+    handler.remove(chest_id)
+    handler.flush_events()
+    assert lifecycle[-1] == [Event(INVENTORY_REMOVED, chest_id)]
+    assert len(apples) == len(player) == 1
+
+
+def test_unknown_kind_and_unsubscribe(handler):
+    with pytest.raises(ValueError):
+        handler.events.subscribe(print, kinds={"item_eaten"})
+
+    player_id = handler.add(Inventory("Player"))
+    received = []
+    subscription = handler.events.subscribe(received.append, items={APPLE})
+    handler.events.unsubscribe(subscription)
+    handler.give(player_id, APPLE)
+    handler.flush_events()
+    assert received == []
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Tests for fit_plan() against what give() actually does
+
+Created on 2026.10.18
+"""
+
+
+import random
+
+import pytest
+
+from scripts.inventory import Inventory, SlotInventory, Item
+
+
+ITEMS = [Item("Test arrow", 20, 0.05), Item("Test potion", 5, 0.5), Item("Test shield", 1, 6.0)]
+
+
+def counts(inventory: SlotInventory) -> list[int]:
+    return [0 if slot is None else slot.count for slot in inventory.slots]
+
+
+def fragmented(seed: int) -> SlotInventory:
+    """Return a SlotInventory with partial stacks and holes in it."""
+    rng = random.Random(seed)
+    inventory = SlotInventory("Chest", 16)
+    for _ in range(25):
+        item = rng.choice(ITEMS)
+        if rng.random() < 0.6:
+            inventory.give(item, rng.randint(1, 2 * item.stack_size))
+        else:
+            inventory.take(item, rng.randint(1, item.stack_size))
+    return inventory
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_plan_matches_give(seed):
+    rng = random.Random(seed)
+    inventory = fragmented(seed)
+    requested = [(item, rng.randint(0, 3 * item.stack_size)) for item in rng.choices(ITEMS, k=4)]
+
+    plan = inventory.fit_plan(requested)
+
+    # give the merged counts one Item after another, like the plan assumes
+    for item, count in plan.requested.items():
+        before = counts(inventory)
+        left = inventory.give(item, count)
+        after = counts(inventory)
+
+        assert count - left == plan.accepted[item]
+        changed = [(index, after[index] - before[index]) for index in range(len(after)) if after[index] != before[index]]
+        assert sorted(plan.slots[item]) == changed
+
+
+def test_duplicates_are_merged():
+    arrow = ITEMS[0]
+    inventory = SlotInventory("Quiver", 2)
+    inventory.give(arrow, 15)
+
+    plan = inventory.fit_plan([(arrow, 10), (arrow, 20)])
+    assert plan.requested == {arrow: 30}
+    assert plan.accepted == {arrow: 25}
+    assert plan.slots == {arrow: [(0, 5), (1, 20)]}
+    assert not plan.fits
+    # nothing changed
+    assert counts(inventory) == [15, 0]
+
+
+def test_slotless_plan_has_no_slots():
+    plan = Inventory("Bag").fit_plan({ITEMS[2]: 3})
+    assert plan.fits
+    assert plan.slots is None
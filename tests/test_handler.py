@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests for InventoryHandler's bookkeeping
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, Item
+
+
+APPLE = Item("Test apple", 10, 0.25)
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_add_refuses_duplicate_uuid(concurrent):
+    handler = InventoryHandler._init(concurrent=concurrent)
+    chest = Inventory("Chest")
+    chest.give(APPLE, 3)
+    chest_id = handler.add(chest)
+
+    other = Inventory("Other")
+    other.give(APPLE, 5)
+    with pytest.raises(ValueError):
+        handler.add(other, chest_id)
+
+    assert handler.get(chest_id) is chest
+    assert handler.locate(APPLE) == {chest_id: 3}
+    assert other._handler is None
+    # the original is still usable (and lockable)
+    handler.give(chest_id, APPLE, 1)
+    assert handler.total(APPLE) == 4
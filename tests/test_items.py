@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Tests for Item interning
+
+Created on 2026.10.18
+"""
+
+
+import copy
+import pickle
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, Item, item_registry
+
+
+def test_items_are_interned():
+    apple = Item("Test apple", 10, 0.25)
+    assert Item("Test apple", 10, 0.25) is apple
+    assert Item("Test apple", 10, 0.25, 0.0) is apple
+    assert copy.copy(apple) is apple
+    assert copy.deepcopy(apple) is apple
+    assert pickle.loads(pickle.dumps(apple)) is apple
+    assert apple in item_registry
+
+
+def test_make_and_replace_intern():
+    apple = Item("Test apple", 10, 0.25)
+    assert Item._make(("Test apple", 10, 0.25, 0.0)) is apple
+
+    big_apple = apple._replace(stack_size=20)
+    assert type(big_apple) is Item
+    assert big_apple is Item("Test apple", 20, 0.25)
+    assert big_apple._replace(stack_size=10) is apple
+
+    with pytest.raises(ValueError):
+        apple._replace(colour="red")
+
+
+def test_containers_arent_copied():
+    handler = InventoryHandler._init()
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+    with pytest.raises(TypeError):
+        bag._replace(name="Sack")
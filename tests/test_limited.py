@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Tests for LimitedInventory (mass and volume limits)
+
+Created on 2026.10.18
+"""
+
+
+import math
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, LimitedInventory, Item
+
+
+# 0.1 doesn't add up exactly in floating point
+STONE = Item("Test stone", 50, 0.1, 0.3)
+FEATHER = Item("Test feather", 100, 0.0, 0.0)
+
+
+def test_give_takes_what_fits():
+    backpack = LimitedInventory("Backpack", max_mass=1.0, max_volume=2.4)
+
+    # the volume runs out first: 8 * 0.3 = 2.4
+    assert backpack.max_acceptable(STONE) == 8
+    assert backpack.give(STONE, 10) == 2
+    assert backpack.amount(STONE) == 8
+    assert math.isclose(backpack.volume, 2.4)
+    assert backpack.give(STONE, 1) == 1
+
+    # things with no mass or volume always fit
+    assert backpack.max_acceptable(FEATHER) == math.inf
+    assert backpack.give(FEATHER, 500) == 0
+
+    backpack.take(STONE, 3)
+    assert backpack.max_acceptable(STONE) == 3
+    assert backpack.has_space_for(STONE, 3)
+    assert not backpack.has_space_for(STONE, 4)
+
+
+def test_transfer_moves_what_fits():
+    handler = InventoryHandler._init()
+    chest_id = handler.add(SlotInventory("Chest", 4))
+    backpack_id = handler.add(LimitedInventory("Backpack", max_mass=0.5))
+    handler.give(chest_id, STONE, 20)
+
+    handler.transfer(chest_id, backpack_id, STONE, 20)
+    assert handler.get(backpack_id).amount(STONE) == 5
+    # the rest stays where it was
+    assert handler.get(chest_id).amount(STONE) == 15
+
+    results = handler.transfer_many(chest_id, backpack_id, {STONE: 15, FEATHER: 0})
+    assert [(result.requested, result.moved) for result in results] == [(15, 0), (0, 0)]
+    assert handler.total(STONE) == 20
+
+
+def test_contents_of_containers_count_towards_the_limit():
+    handler = InventoryHandler._init()
+    backpack_id = handler.add(LimitedInventory("Backpack", max_mass=2.0))
+    pouch = handler.add_container("Pouch", 0.5, Inventory("Pouch"))
+    handler.give(backpack_id, pouch)
+    backpack = handler.get(backpack_id)
+    assert backpack.max_acceptable(STONE) == 15
+
+    # stones put into the pouch aren't refused, but leave less room in the backpack
+    handler.give(pouch.inventory_id, STONE, 20)
+    assert math.isclose(backpack.mass, 2.5)
+    assert backpack.max_acceptable(STONE) == 0
+    assert backpack.give(STONE, 1) == 1
+
+    handler.take(pouch.inventory_id, STONE, 10)
+    assert backpack.max_acceptable(STONE) == 5
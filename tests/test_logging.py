@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Tests for setup_logging()
+
+Created on 2026.10.18
+"""
+
+
+import logging
+
+import pytest
+
+from scripts import inventory
+
+
+@pytest.fixture
+def game_log():
+    game_log = logging.getLogger("scripts")
+    level = game_log.level
+    yield game_log
+    inventory._stop_logging()
+    game_log.setLevel(level)
+
+
+def test_off_only_silences_the_game(game_log):
+    root = logging.getLogger()
+    root_level = root.level
+
+    inventory.setup_logging("off", None)
+    assert not logging.getLogger("scripts.inventory").isEnabledFor(logging.CRITICAL)
+    assert logging.getLogger("someone.else").isEnabledFor(logging.CRITICAL)
+    assert root.level == root_level
+
+    # turning it back on works without touching anything else either
+    inventory.setup_logging("warning", None)
+    assert logging.getLogger("scripts.inventory").isEnabledFor(logging.WARNING)
+    assert not logging.getLogger("scripts.inventory").isEnabledFor(logging.INFO)
+    assert root.level == root_level
+
+
+def test_writes_log_file(game_log, tmp_path):
+    path = tmp_path / "game.log"
+    root_handlers = list(logging.getLogger().handlers)
+
+    assert inventory.setup_logging("INFO", str(path)) is not None
+    logging.getLogger("scripts.inventory").info("hello from the test")
+    # writes out what's still queued
+    inventory._stop_logging()
+
+    assert "hello from the test" in path.read_text(encoding="utf-8")
+    assert logging.getLogger().handlers == root_handlers
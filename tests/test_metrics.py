@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Tests for the opt-in instrumentation (metrics.py)
+
+Created on 2026.10.18
+"""
+
+
+from scripts.inventory import InventoryHandler, LimitedInventory, SlotInventory, ItemStack, Item
+from scripts import metrics
+
+
+APPLE = Item("Test apple", 10, 0.25)
+
+
+def originals() -> dict[tuple[type, str], object]:
+    methods = {(cls, name): cls.__dict__[name] for cls, names in metrics.INSTRUMENTED.items() for name in names}
+    methods.update({(ItemStack, name): ItemStack.__dict__[name] for name in metrics.TOUCHES})
+    return methods
+
+
+def test_disable_restores_methods():
+    before = originals()
+
+    collected = metrics.enable()
+    assert metrics.active() is collected
+    assert all(originals()[key] is not method for key, method in before.items())
+
+    assert metrics.disable() is collected
+    assert metrics.active() is None
+    assert originals() == before
+
+
+def test_enabled_restores_methods_after_exception():
+    before = originals()
+    try:
+        with metrics.enabled():
+            raise KeyError("boom")
+    except KeyError:
+        pass
+    assert originals() == before
+    assert metrics.active() is None
+
+
+def test_super_calls_count_once():
+    handler = InventoryHandler._init()
+    with metrics.enabled() as collected:
+        bag_id = handler.add(LimitedInventory("Bag", max_mass=10.0))
+        handler.give(bag_id, APPLE, 4)
+
+    snapshot = collected.snapshot()
+    assert snapshot["LimitedInventory.give"]["calls"] == 1
+    # LimitedInventory.give() goes on to Inventory.give() with super()
+    assert "Inventory.give" not in snapshot
+    assert snapshot["InventoryHandler.give"]["calls"] == 1
+
+
+def test_stacks_touched():
+    chest = SlotInventory("Chest", 4)
+    with metrics.enabled() as collected:
+        chest.give(APPLE, 25)
+        chest.take(APPLE, 5)
+
+    snapshot = collected.snapshot()
+    # three new stacks, then one taken from
+    assert snapshot["SlotInventory.give"]["stacks_touched"] == 3
+    assert snapshot["SlotInventory.take"]["stacks_touched"] == 1
+    assert 'bnb_inventory_stacks_touched_total{operation="SlotInventory.give"} 3' in collected.to_prometheus()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tests for InventoryHandler.transaction()
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import (InventoryHandler, Inventory, SlotInventory, LimitedInventory, Item,
+                               ContainerError, TransactionError)
+
+
+X = Item("Test X", 10, 1.0)
+Y = Item("Test Y", 10, 1.0)
+Z = Item("Test Z", 64, 1.0)
+
+
+def slots(inventory: SlotInventory) -> list:
+    return [None if slot is None else (slot.item, slot.count) for slot in inventory.slots]
+
+
+def test_failed_transaction_changes_nothing():
+    handler = InventoryHandler._init()
+    inventory = SlotInventory("Chest", 2)
+    inventory.give(Y, 10)
+    inventory.give(X, 9)
+    chest_id = handler.add(inventory)
+    before = slots(inventory)
+
+    # undoing the give of X would take it out of slot 1 and leave the 2 that
+    # went into slot 0, so there'd be no room to give the Y back
+    with pytest.raises(TransactionError):
+        with handler.transaction() as tx:
+            tx.take(chest_id, Y, 10)
+            tx.give(chest_id, X, 3)
+            tx.give(chest_id, Z, 50)
+
+    assert slots(inventory) == before
+    assert handler.total(Y) == 10
+    assert handler.total(X) == 9
+    assert handler.total(Z) == 0
+
+
+def test_transaction_applies_everything():
+    handler = InventoryHandler._init()
+    chest = SlotInventory("Chest", 2)
+    chest.give(Y, 10)
+    chest_id = handler.add(chest)
+    pack_id = handler.add(LimitedInventory("Pack", max_mass=10))
+
+    with handler.transaction() as tx:
+        tx.transfer(chest_id, pack_id, Y, 10)
+        tx.give(chest_id, Z, 100)
+
+    assert handler.get(pack_id).amount(Y) == 10
+    assert slots(chest) == [(Z, 64), (Z, 36)]
+
+
+def test_transaction_respects_limits():
+    handler = InventoryHandler._init()
+    chest = Inventory("Chest")
+    chest.give(Y, 11)
+    chest_id = handler.add(chest)
+    pack_id = handler.add(LimitedInventory("Pack", max_mass=10))
+
+    with pytest.raises(TransactionError):
+        with handler.transaction() as tx:
+            tx.transfer(chest_id, pack_id, Y, 6)
+            tx.transfer(chest_id, pack_id, Y, 5)
+
+    assert chest.amount(Y) == 11
+    assert handler.get(pack_id).amount(Y) == 0
+
+
+def test_transaction_moves_container():
+    handler = InventoryHandler._init()
+    room_id = handler.add(Inventory("Room"))
+    player_id = handler.add(Inventory("Player"))
+    bag = handler.add_container("Bag", 1.0, Inventory("Bag"))
+    handler.give(room_id, bag)
+
+    # the same bag can't end up in two places
+    with pytest.raises(ContainerError):
+        with handler.transaction() as tx:
+            tx.transfer(room_id, player_id, bag)
+            tx.give(room_id, bag)
+    assert handler.get(room_id).amount(bag) == 1
+    assert handler.get(player_id).amount(bag) == 0
+
+    with handler.transaction() as tx:
+        tx.transfer(room_id, player_id, bag)
+    assert handler.get(room_id).amount(bag) == 0
+    assert bag.inventory.parent is handler.get(player_id)
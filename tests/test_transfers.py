@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Tests for transfer_many() and transfer_all()
+
+Created on 2026.10.18
+"""
+
+
+import pytest
+
+from scripts.inventory import InventoryHandler, Inventory, SlotInventory, Item, TransferResult
+
+
+APPLE = Item("Test apple", 10, 0.25)
+BREAD = Item("Test bread", 5, 0.5)
+SWORD = Item("Test sword", 1, 3.0)
+
+
+@pytest.fixture
+def handler():
+    return InventoryHandler._init()
+
+
+def test_duplicate_entries_are_merged(handler):
+    player_id = handler.add(Inventory("Player"))
+    chest_id = handler.add(SlotInventory("Chest", 4))
+    handler.give(player_id, APPLE, 12)
+    handler.give(player_id, BREAD, 3)
+
+    results = handler.transfer_many(player_id, chest_id, [(APPLE, 5), (BREAD, 2), (APPLE, 4)])
+    # one result per Item, in the order they first appear
+    assert results == [TransferResult(APPLE, 9, 9), TransferResult(BREAD, 2, 2)]
+    assert handler.get(chest_id).amount(APPLE) == 9
+    assert handler.get(player_id).amount(APPLE) == 3
+
+    # asking for more than there is moves what there is
+    results = handler.transfer_many(player_id, chest_id, [(APPLE, 2), (APPLE, 2)])
+    assert results == [TransferResult(APPLE, 4, 3)]
+    assert handler.get(player_id).amount(APPLE) == 0
+    assert handler.locate(APPLE) == {chest_id: 12}
+
+
+def test_full_target(handler):
+    player_id = handler.add(Inventory("Player"))
+    chest_id = handler.add(SlotInventory("Chest", 3))
+    handler.give(chest_id, APPLE, 14)
+    handler.give(player_id, APPLE, 10)
+    handler.give(player_id, SWORD, 2)
+
+    # the first sword takes the last empty slot, the partial stack of apples 6 more
+    results = handler.transfer_many(player_id, chest_id, {SWORD: 2, APPLE: 10})
+    assert results == [TransferResult(SWORD, 2, 1), TransferResult(APPLE, 10, 6)]
+    assert handler.get(chest_id).free_slots == 0
+    assert handler.get(player_id).counts() == {SWORD: 1, APPLE: 4}
+
+    # nothing fits anymore and nothing is lost
+    results = handler.transfer_all(player_id, chest_id)
+    assert [result.moved for result in results] == [0, 0]
+    assert handler.total(APPLE) == 24
+    assert handler.total(SWORD) == 2
+
+
+def test_transfer_all_empties_source(handler):
+    player_id = handler.add(Inventory("Player"))
+    chest_id = handler.add(SlotInventory("Chest", 8))
+    handler.give(player_id, APPLE, 23)
+    handler.give(player_id, BREAD, 5)
+
+    handler.transfer_all(player_id, chest_id)
+    assert handler.get(player_id).is_empty
+    assert handler.get(chest_id).counts() == {APPLE: 23, BREAD: 5}